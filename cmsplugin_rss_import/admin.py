@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.contrib import admin
-from .models import RSSSource, IntervalSchedule, CrontabSchedule, RSSImport, DjangoJob
+from django.contrib.admin.views.main import ChangeList
+from .models import RSSSource, IntervalSchedule, CrontabSchedule, RSSImport, RSSRun, DjangoJob, refresh_published_items, render_feeds_cache
 from .forms import RSSSourceAdminForm
 
 class HiddenModelAdmin(admin.ModelAdmin):
@@ -19,56 +20,93 @@ class RSSImportAdmin(admin.ModelAdmin):
     def has_add_permission(self, request, obj=None):
         return False
 
+    def save_model(self, request, obj, form, change):
+        super(RSSImportAdmin, self).save_model(request, obj, form, change)
+        refresh_published_items(obj.source_id)
+        render_feeds_cache(obj.source_id)
+
+    def delete_model(self, request, obj):
+        super(RSSImportAdmin, self).delete_model(request, obj)
+        refresh_published_items(obj.source_id)
+        render_feeds_cache(obj.source_id)
+
     def show_in_plugin_action(modeladmin, request, queryset):
         from django.db.models import Case, When
+        source_ids = set(queryset.values_list('source_id', flat=True))
         queryset.update(enabled=Case(
             When(status='complete', then=True),
             default=False))
+        for source_id in source_ids:
+            refresh_published_items(source_id)
+            render_feeds_cache(source_id)
     show_in_plugin_action.short_description = "Use items as input of the RSS Plugin"
 
     def hide_in_plugin_action(modeladmin, request, queryset):
+        source_ids = set(queryset.values_list('source_id', flat=True))
         queryset.update(enabled=False)
+        for source_id in source_ids:
+            refresh_published_items(source_id)
+            render_feeds_cache(source_id)
     hide_in_plugin_action.short_description = "Don't use items as input of the RSS Plugin"
 
 
+class RSSRunAdmin(admin.ModelAdmin):
+    list_display = ('source', 'started_at', 'status', 'duration', 'items_seen', 'items_new', 'items_duplicated', 'items_failed', 'timings')
+    list_filter = ('source__name', 'status')
+    readonly_fields = ('source', 'started_at', 'status', 'duration', 'items_seen', 'items_new', 'items_duplicated', 'items_failed', 'timings', 'error')
+    list_select_related = ('source', )
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class RSSSourceChangeList(ChangeList):
+    def get_results(self, request):
+        super(RSSSourceChangeList, self).get_results(request)
+
+        # Next run times of the page sources in one query instead of one per row
+        sources = dict((obj.get_job_id(), obj) for obj in self.result_list)
+        next_run_times = dict(DjangoJob.objects.filter(job_id__in=sources.keys()).values_list('job_id', 'next_run_time'))
+        for job_id, obj in sources.iteritems():
+            obj.next_run_time = next_run_times.get(job_id)
+
+
 class RSSSourceAdmin(admin.ModelAdmin):
     form = RSSSourceAdminForm
-    list_display = ('name', 'url', 'last_process_date', 'last_import_date', 'next_process_scheduled', 'total_items', 'complete_items', 'scheduled_items', 'processing_items', 'enabled')
+    list_display = ('name', 'url', 'last_process_date', 'last_import_date', 'next_process_scheduled', 'current_interval', 'total_items', 'complete_items', 'scheduled_items', 'processing_items', 'enabled')
     fieldsets = (
         (None, {
             'fields': ('name', 'url', 'settings', 'enabled', 'task'),
             'classes': ('extrapretty', 'wide',),
         }),
         ('Schedule', {
-            'fields': ('interval', 'crontab',),
+            'fields': ('interval', 'crontab', 'adaptive', 'min_interval', 'max_interval', 'current_interval', 'new_items_rate', 'unchanged_rate',),
             'classes': ('extrapretty', 'wide',),
         }),
+        ('Retention', {
+            'fields': ('keep_items', 'keep_days',),
+            'classes': ('extrapretty', 'wide', 'collapse'),
+        }),
         ('Other options', {
             'fields': ('start_date', 'end_date', 'reverse',),
             'classes': ('extrapretty', 'wide', 'collapse'),
         }),
     )
+    readonly_fields = ('current_interval', 'new_items_rate', 'unchanged_rate',)
 
-    def next_process_scheduled(self, obj):
-        try:
-            next_run_time = DjangoJob.objects.only('next_run_time').filter(job_id=obj.url + ':' + obj.task)[0].next_run_time
-        except:
-            next_run_time = None
-        return next_run_time
-
-    def total_items(self, obj):
-        return RSSImport.objects.filter(source=obj).count()
-
-    def complete_items(self, obj):
-        return RSSImport.objects.filter(source=obj, status='complete').count()
+    def get_changelist(self, request, **kwargs):
+        return RSSSourceChangeList
 
-    def scheduled_items(self, obj):
-        return RSSImport.objects.filter(source=obj, status='scheduled').count()
-
-    def processing_items(self, obj):
-        return RSSImport.objects.filter(source=obj, status='processing').count()
+    def next_process_scheduled(self, obj):
+        if not hasattr(obj, 'next_run_time'):
+            try:
+                obj.next_run_time = DjangoJob.objects.only('next_run_time').filter(job_id=obj.get_job_id())[0].next_run_time
+            except:
+                obj.next_run_time = None
+        return obj.next_run_time
 
 admin.site.register(RSSSource, RSSSourceAdmin)
 admin.site.register(RSSImport, RSSImportAdmin)
+admin.site.register(RSSRun, RSSRunAdmin)
 admin.site.register(IntervalSchedule, HiddenModelAdmin)
 admin.site.register(CrontabSchedule, HiddenModelAdmin)
@@ -3,8 +3,62 @@ from __future__ import unicode_literals
 from django.apps import AppConfig
 from django.utils.translation import ugettext_lazy as _
 from apscheduler.schedulers.background import BackgroundScheduler
+import os, sys
 
 scheduler = BackgroundScheduler()
+elector = None
+
+def schedule_maintenance():
+    """
+    Adds the periodic maintenance jobs, or updates their interval if the settings changed
+    """
+    from django.conf import settings
+    from .constants import DEFAULT_RETENTION_INTERVAL, DEFAULT_MEDIA_GC_INTERVAL
+    jobs = (
+        ('rss:retention', 'cmsplugin_rss_import.retention:sweep_retention',
+            getattr(settings, 'RSS_IMPORT_RETENTION_INTERVAL', DEFAULT_RETENTION_INTERVAL)),
+        ('rss:media-gc', 'cmsplugin_rss_import.collector:sweep_orphaned_images',
+            getattr(settings, 'RSS_IMPORT_MEDIA_GC_INTERVAL', DEFAULT_MEDIA_GC_INTERVAL)),
+    )
+    for job_id, function, seconds in jobs:
+        job = scheduler.get_job(job_id)
+        if job is None:
+            scheduler.add_job(function, trigger='interval', seconds=seconds, id=job_id, name=job_id, replace_existing=True)
+        elif job.trigger.interval.total_seconds() != seconds:
+            scheduler.reschedule_job(job_id, trigger='interval', seconds=seconds)
+
+def get_management_command():
+    """
+    Returns the name of the management command the process runs, or None when it isn't one
+    """
+    if len(sys.argv) > 1 and os.path.basename(sys.argv[0]) in ('manage.py', 'django-admin', 'django-admin.py', '__main__.py'):
+        return sys.argv[1]
+    return None
+
+def is_long_lived():
+    """
+    Returns whether the process serves requests for its whole life: an application
+    server, or the development server without its autoreloader parent. Other
+    management commands only live for their task, rss_worker joins the election itself.
+    """
+    command = get_management_command()
+    if command is None:
+        return True
+    return command == 'runserver' and ('--noreload' in sys.argv or os.environ.get('RUN_MAIN') == 'true')
+
+def start_leader_election():
+    """
+    Makes the process compete for running the scheduler, once
+    """
+    global elector
+    if elector is None:
+        from django.conf import settings
+        from .constants import DEFAULT_LEADER_HEARTBEAT
+        from .leader import LeaderElector
+        elector = LeaderElector(scheduler, heartbeat=getattr(settings, 'RSS_IMPORT_LEADER_HEARTBEAT', DEFAULT_LEADER_HEARTBEAT),
+            on_elected=schedule_maintenance)
+        elector.start()
+    return elector
 
 class RssImportConfig(AppConfig):
     name = 'cmsplugin_rss_import'
@@ -12,36 +66,25 @@ class RssImportConfig(AppConfig):
 
     def ready(self):
         from django.conf import settings
-        from constants import CUSTOM_TEMPLATE_DIR
-        import os
-
-        custom_dir = os.path.join(settings.DATA_DIR, CUSTOM_TEMPLATE_DIR)
-        if not os.path.isdir(custom_dir):
-            os.makedirs(custom_dir)
-
         import cmsplugin_rss_import.tasks
         import cmsplugin_rss_import.signals
         from .jobstores import DjangoJobStore
         import warnings, atexit
 
+        # The scheduler starts paused, so the process can manage jobs without running them
         warnings.warn('Starting background scheduler')
         scheduler.add_jobstore(DjangoJobStore(), 'default')
-        scheduler.start()
+        scheduler.start(paused=True)
+
+        if getattr(settings, 'RSS_IMPORT_RUN_SCHEDULER', True) and is_long_lived():
+            start_leader_election()
 
         @atexit.register
         def stop_scheduler():
             try:
                 warnings.warn('Stopping background scheduler')
+                if elector:
+                    elector.stop()
                 scheduler.shutdown()
             except Exception as e:
                 warnings.warn('There was an error stopping the background scheduler: %s' % str(e))
-
-        try:
-            from .models import RSSFeed
-            feeds = RSSFeed.objects.all()
-            for feed in feeds:
-                if not os.path.exists(feed.get_custom_html_path()) and feed.html_template:
-                    feed.save_html_custom_template()
-        except:
-            # Initial migration hasn't happened. Ignore
-            pass
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .constants import MEDIA_GC_BATCH_SIZE, DEFAULT_MEDIA_GC_GRACE, DEFAULT_MEDIA_GC_PAUSE
+from .models import RSSImport, RSSMedia
+import time, warnings
+
+def get_media_folder_ids():
+    """
+    Returns the pks of the "RSS Files" folders and the folders of the sources inside them
+    """
+    from filer.models.foldermodels import Folder
+    roots = list(Folder.objects.filter(name='RSS Files').values_list('pk', flat=True))
+    return roots + list(Folder.objects.filter(parent_id__in=roots).values_list('pk', flat=True))
+
+def get_grace_date():
+    """
+    Returns the date since which uploaded or reused images are kept, as a run in progress may reference them
+    """
+    return timezone.now() - timedelta(seconds=getattr(settings, 'RSS_IMPORT_MEDIA_GC_GRACE', DEFAULT_MEDIA_GC_GRACE))
+
+def delete_orphaned_images(image_ids, since):
+    """
+    Deletes the images among image_ids that no import references and no run
+    reused since the given date, returning how many were deleted
+    """
+    from filer.models.imagemodels import Image
+    with transaction.atomic():
+        # Runs mark their media as used before referencing the images, locking them keeps that out of the check
+        list(RSSMedia.objects.select_for_update().filter(image_id__in=image_ids).values_list('pk', flat=True))
+        orphans = list(Image.objects.filter(pk__in=image_ids, rss_imports__isnull=True)
+            .exclude(rss_media__used_at__gte=since).values_list('pk', flat=True))
+        if orphans:
+            Image.objects.filter(pk__in=orphans).delete()
+    return len(orphans)
+
+def collect_orphaned_images(dry_run=False, batch_size=MEDIA_GC_BATCH_SIZE):
+    """
+    Deletes the images of the RSS folders that no import references, returning
+    how many were deleted (or would be on a dry run). Candidates are walked in
+    batches, marked against the import references and swept with a pause
+    between batches. Images uploaded or reused within the grace period are
+    skipped, as a run in progress may not have referenced them yet.
+    """
+    from filer.models.imagemodels import Image
+    Through = RSSImport.images.through
+    pause = getattr(settings, 'RSS_IMPORT_MEDIA_GC_PAUSE', DEFAULT_MEDIA_GC_PAUSE)
+
+    folder_ids = get_media_folder_ids()
+    if not folder_ids:
+        return 0
+
+    since = get_grace_date()
+    candidates = Image.objects.filter(folder_id__in=folder_ids, uploaded_at__lt=since).exclude(rss_media__used_at__gte=since)
+    collected = 0
+    last_pk = 0
+    while True:
+        batch = list(candidates.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1]
+
+        # Mark
+        referenced = set(Through.objects.filter(image_id__in=batch).values_list('image_id', flat=True))
+        orphans = [pk for pk in batch if pk not in referenced]
+        if not orphans:
+            continue
+
+        # Sweep, checking again in case a run picked the image up meanwhile
+        if dry_run:
+            collected += len(orphans)
+            continue
+        collected += delete_orphaned_images(orphans, since)
+        time.sleep(pause)
+
+    return collected
+
+def sweep_orphaned_images():
+    """
+    Collects the orphaned images, run periodically by the scheduler
+    """
+    try:
+        collected = collect_orphaned_images()
+        if collected:
+            warnings.warn('Deleted %s orphaned RSS images' % collected)
+    except Exception as e:
+        warnings.warn('Error collecting the orphaned RSS images: %s' % str(e))
+    finally:
+        connection.close()
@@ -1,3 +1,35 @@
 # -*- coding: utf-8 -*-
-CUSTOM_TEMPLATE_DIR = 'cmsplugin_rss_import/templates/feeds/custom'
 DEFAULT_FEED_PLUGIN_TEMPLATE = 'feeds/default.html'
+FEED_CHUNK_SIZE = 64 * 1024
+FEED_SPOOL_MAX_SIZE = 1024 * 1024
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_FETCH_CONNECT_TIMEOUT = 10
+DEFAULT_FETCH_READ_TIMEOUT = 30
+DEFAULT_FETCH_HOST_CONCURRENCY = 2
+DEFAULT_FETCH_MAX_BYTES = 50 * 1024 * 1024
+IMAGE_BATCH_SIZE = 50
+DEFAULT_IMAGE_WORKERS = 4
+DEFAULT_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_IMAGE_TIMEOUT = 60
+DEFAULT_IMAGE_CACHE_TTL = 24 * 60 * 60
+PUBLISHED_ITEMS_SIZE = 20
+DEFAULT_PRERENDER_TIMEOUT = 24 * 60 * 60
+DEFAULT_LEADER_HEARTBEAT = 10
+ADAPTIVE_SMOOTHING = 0.3
+ADAPTIVE_TARGET_ITEMS = 1
+ADAPTIVE_MAX_STEP = 2
+DEFAULT_ADAPTIVE_MIN_INTERVAL = 60
+DEFAULT_ADAPTIVE_MAX_INTERVAL = 24 * 60 * 60
+DEFAULT_RUN_HISTORY = 100
+RETENTION_BATCH_SIZE = 500
+DEFAULT_RETENTION_INTERVAL = 60 * 60
+MEDIA_GC_BATCH_SIZE = 100
+DEFAULT_MEDIA_GC_INTERVAL = 6 * 60 * 60
+DEFAULT_MEDIA_GC_GRACE = 24 * 60 * 60
+DEFAULT_MEDIA_GC_PAUSE = 1
+DEFAULT_THUMBNAIL_SIZE = '640x480'
+THUMBNAIL_OPTIONS = {'crop': True, 'upscale': True}
+DEFAULT_THUMBNAIL_WORKERS = 2
+DEFAULT_FULL_SCAN_INTERVAL = 24 * 60 * 60
+DEFAULT_PROCESSING_TIMEOUT = 60 * 60
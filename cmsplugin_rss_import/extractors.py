@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from dateutil.parser import parse as time_parse
+from lxml import etree as ET
+import json, re, threading
+
+_extractors = {}
+_extractors_lock = threading.Lock()
+
+def get_extractor(source):
+    """
+    Returns the compiled extractor of a source, compiling it again if its settings changed
+    """
+    settings_key = json.dumps(source.settings, sort_keys=True)
+    with _extractors_lock:
+        cached = _extractors.get(source.pk)
+        if cached is None or cached[0] != settings_key:
+            cached = (settings_key, FeedExtractor(source.settings))
+            _extractors[source.pk] = cached
+    return cached[1]
+
+def invalidate_extractor(source_id):
+    with _extractors_lock:
+        _extractors.pop(source_id, None)
+
+def _wrapper_steps(wrapper):
+    """
+    Splits a wrapper path into its tags, returning None when the path can't be
+    matched while streaming (wildcards, predicates or parent steps)
+    """
+    descendant = False
+    if wrapper.startswith('.//'):
+        descendant, wrapper = True, wrapper[3:]
+    elif wrapper.startswith('./'):
+        wrapper = wrapper[2:]
+
+    steps = re.findall(r'(?:\{[^}]*\})?[^/{]+', wrapper)
+    if not steps or '/'.join(steps) != wrapper or any(step in ('.', '..') or '*' in step or '[' in step for step in steps):
+        return None
+    return descendant, steps
+
+
+class ExtractedField(object):
+    """
+    A field of the processing settings resolved to its converter
+    """
+
+    def __init__(self, field):
+        self.name = field['target'] if 'target' in field else field['source']
+        self.path = field['source']
+        self.image_location = None
+        self.is_image = field.get('type') == 'image'
+
+        if field.get('type') == 'date' and 'save_format' in field:
+            save_format = field['save_format']
+            self.convert = lambda element: time_parse(element.text).strftime(save_format)
+        elif 'empty' not in field or field.get('type', 'image') != 'image':
+            self.convert = lambda element: element.text
+        elif isinstance(field['attributes'], basestring):
+            attribute = field['attributes']
+            self.convert = lambda element: element.attrib[attribute]
+        else:
+            attributes = [(attribute['target'] if 'target' in attribute else attribute['source'], attribute['source'])
+                for attribute in field['attributes']]
+            self.convert = lambda element: dict((target, element.attrib[source]) for target, source in attributes)
+
+        if self.is_image and 'empty' in field:
+            # The url of empty images is one of the attributes read
+            self.image_location = field['location']
+
+
+class FeedExtractor(object):
+    """
+    Processing settings of a source compiled once to extract the content of feed items
+    """
+
+    def __init__(self, process_settings):
+        self.wrapper = process_settings['wrapper']
+        self.wrapper_steps = _wrapper_steps(self.wrapper)
+        self.fields = [ExtractedField(field) for field in process_settings['fields']]
+        self._finders = {}
+
+    def _compile_path(self, path, nsmap):
+        # XPath can't express Clark notation nor the default namespace, ElementPath is kept for those
+        if '{' in path or None in nsmap:
+            return lambda element: element.find(path, nsmap)
+
+        xpath = ET.XPath(path, namespaces=nsmap, smart_strings=False)
+        def find(element):
+            found = xpath(element)
+            return found[0] if found else None
+        return find
+
+    def get_finders(self, nsmap):
+        key = tuple(sorted(nsmap.items()))
+        finders = self._finders.get(key)
+        if finders is None:
+            finders = [self._compile_path(field.path, nsmap) for field in self.fields]
+            self._finders[key] = finders
+        return finders
+
+    def iter_items(self, rss_file, stream=False):
+        """
+        Yields the items matching the wrapper.
+        In stream mode the feed is read with iterparse and every
+        processed item is released, otherwise the whole tree is parsed.
+        """
+        if not stream or self.wrapper_steps is None:
+            rss = ET.parse(rss_file).getroot()
+            for item in rss.findall(self.wrapper):
+                yield item
+            return
+
+        descendant, steps = self.wrapper_steps
+        for event, item in ET.iterparse(rss_file, events=('end', ), tag=steps[-1], huge_tree=True):
+            ancestors = [ancestor.tag for ancestor in item.iterancestors()][:-1]
+            ancestors.reverse()
+            if ancestors != steps[:-1] and not (descendant and ancestors[len(ancestors) - len(steps) + 1:] == steps[:-1]):
+                continue
+
+            yield item
+
+            # Release the item and the siblings already walked
+            item.clear()
+            while item.getprevious() is not None:
+                del item.getparent()[0]
+
+    def extract(self, element):
+        """
+        Returns the content to save of a feed item and the list of its images to download
+        """
+        item_to_save = {}
+        image_fields = []
+        for field, find in zip(self.fields, self.get_finders(element.nsmap)):
+            field_content = find(element)
+            content = field.convert(field_content)
+            item_to_save[field.name] = content
+
+            if field.is_image:
+                image_url = content[field.image_location] if field.image_location else content
+                image_fields.append({'name': field.name, 'url': image_url})
+
+        return item_to_save, image_fields
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from .constants import DEFAULT_FETCH_CONNECT_TIMEOUT, DEFAULT_FETCH_READ_TIMEOUT, DEFAULT_FETCH_HOST_CONCURRENCY
+import httplib, socket, threading, urllib2, urlparse
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+class FetchError(Exception):
+    pass
+
+
+class Urllib2Response(object):
+    def __init__(self, response=None, status=200):
+        self._response = response
+        self.status = status
+
+    def getheader(self, name, default=None):
+        return self._response.info().getheader(name, default) if self._response else default
+
+    def read(self, size=-1):
+        return self._response.read(size)
+
+    def close(self):
+        if self._response:
+            self._response.close()
+
+
+class Urllib2Fetcher(object):
+
+    """
+    Opens every request in a new connection with urllib2
+    """
+
+    def __init__(self, read_timeout):
+        self.read_timeout = read_timeout
+
+    def open(self, url, headers=None):
+        request = urllib2.Request(url, headers=headers or {})
+        try:
+            return Urllib2Response(urllib2.urlopen(request, timeout=self.read_timeout))
+        except urllib2.HTTPError as e:
+            if e.code == 304:
+                return Urllib2Response(status=304)
+            raise
+
+
+class PooledResponse(object):
+    def __init__(self, fetcher, key, connection, response, semaphore):
+        self._fetcher = fetcher
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self._semaphore = semaphore
+        self.status = response.status
+
+    def getheader(self, name, default=None):
+        return self._response.getheader(name, default)
+
+    def read(self, size=-1):
+        return self._response.read(size) if size >= 0 else self._response.read()
+
+    def close(self):
+        if self._semaphore is None:
+            return
+
+        # Only a connection with its response fully read can be used again
+        if self._response.isclosed() and not self._response.will_close:
+            self._fetcher._checkin(self._key, self._connection)
+        else:
+            self._connection.close()
+        self._semaphore.release()
+        self._semaphore = None
+
+
+class PooledFetcher(object):
+
+    """
+    Reuses keep-alive connections per host and limits the requests open at
+    the same time against a host. Responses hold their connection and their
+    slot of the host until they are closed.
+    """
+
+    def __init__(self, connect_timeout, read_timeout, host_concurrency):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.host_concurrency = host_concurrency
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._idle = {}
+
+    def open(self, url, headers=None):
+        for redirect in range(MAX_REDIRECTS + 1):
+            response = self._open(url, headers or {})
+            if response.status not in REDIRECT_CODES:
+                break
+
+            location = response.getheader('Location')
+            self._discard(response)
+            if not location:
+                raise FetchError('Redirect without location from %s' % url)
+            url = urlparse.urljoin(url, location)
+        else:
+            raise FetchError('Too many redirects from %s' % url)
+
+        if response.status == 304:
+            # Drain the empty body so the connection can be reused
+            response.read()
+        elif response.status >= 400:
+            self._discard(response)
+            raise FetchError('HTTP Error %s fetching %s' % (response.status, url))
+
+        return response
+
+    def _discard(self, response):
+        try:
+            response.read()
+        finally:
+            response.close()
+
+    def _open(self, url, headers):
+        parsed = urlparse.urlsplit(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        path = urlparse.urlunsplit(('', '', parsed.path or '/', parsed.query, ''))
+        headers = dict(headers, **{'Host': parsed.netloc, 'Accept-Encoding': 'identity'})
+
+        semaphore = self._get_semaphore(key)
+        semaphore.acquire()
+        try:
+            connection = self._checkout(key)
+            reused = connection is not None
+            while True:
+                if connection is None:
+                    connection = self._connect(key)
+                try:
+                    connection.request('GET', path, headers=headers)
+                    connection.sock.settimeout(self.read_timeout)
+                    response = connection.getresponse()
+                    break
+                except (httplib.HTTPException, socket.error):
+                    connection.close()
+                    connection = None
+                    if not reused:
+                        raise
+                    # The server closed an idle keep-alive connection, retry once with a new one
+                    reused = False
+        except:
+            semaphore.release()
+            raise
+
+        return PooledResponse(self, key, connection, response, semaphore)
+
+    def _connect(self, key):
+        scheme, host, port = key
+        connection_class = httplib.HTTPSConnection if scheme == 'https' else httplib.HTTPConnection
+        connection = connection_class(host, port, timeout=self.connect_timeout)
+        connection.connect()
+        return connection
+
+    def _get_semaphore(self, key):
+        with self._lock:
+            if key not in self._semaphores:
+                self._semaphores[key] = threading.BoundedSemaphore(self.host_concurrency)
+            return self._semaphores[key]
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            return idle.pop() if idle else None
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.host_concurrency:
+                idle.append(connection)
+                return
+        connection.close()
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+def get_fetcher():
+    """
+    Returns the fetcher selected by the RSS_IMPORT_FETCHER setting
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            read_timeout = getattr(settings, 'RSS_IMPORT_FETCH_READ_TIMEOUT', DEFAULT_FETCH_READ_TIMEOUT)
+            if getattr(settings, 'RSS_IMPORT_FETCHER', 'urllib2') == 'pooled':
+                _fetcher = PooledFetcher(
+                    getattr(settings, 'RSS_IMPORT_FETCH_CONNECT_TIMEOUT', DEFAULT_FETCH_CONNECT_TIMEOUT),
+                    read_timeout,
+                    getattr(settings, 'RSS_IMPORT_FETCH_HOST_CONCURRENCY', DEFAULT_FETCH_HOST_CONCURRENCY))
+            else:
+                _fetcher = Urllib2Fetcher(read_timeout)
+        return _fetcher
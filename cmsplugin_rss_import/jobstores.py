@@ -1,57 +1,149 @@
 # -*- coding: utf-8 -*-
 from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.schedulers.base import STATE_RUNNING
+from django.db import IntegrityError
+from django.db.models import Case, DateTimeField, Value, When
 from .models import DjangoJob
+import uuid
 
 class DjangoJobStore(BaseJobStore):
 
     """
     Stores jobs in a Django database.
+
+    Next run times live in a plain column, so finding due jobs never unpickles
+    the job state. Reconstituted jobs are kept in memory by the version token
+    of their state, a new uuid on every write, and only unpickled again when
+    another process changes or recreates them.
+    While the scheduler is running, updates that only move the next run time
+    are written together when the scheduler asks for the next wakeup.
     """
 
+    def __init__(self):
+        self._jobs = {}
+        self._pending_run_times = {}
+
+    def shutdown(self):
+        self._flush()
+
     def lookup_job(self, job_id):
-        try:
-            job_state = DjangoJob.objects.only('job_state').get(job_id=job_id).job_state
-        except:
-            job_state = None
-        return self._reconstitute_job(job_state) if job_state else None
+        self._flush()
+        rows = DjangoJob.objects.filter(job_id=job_id).values_list('job_id', 'version', 'next_run_time')
+        jobs = self._load(rows)
+        return jobs[0] if jobs else None
 
     def get_due_jobs(self, now):
-        return self._get_jobs(next_run_time__lte=now)
+        self._flush()
+        return self._load(DjangoJob.objects.filter(next_run_time__lte=now).order_by('next_run_time')
+            .values_list('job_id', 'version', 'next_run_time'))
 
     def get_next_run_time(self):
+        # The scheduler asks for the next wakeup after processing the due jobs, so their updates are written here
+        self._flush()
         try:
             return DjangoJob.objects.only('next_run_time').filter(next_run_time__isnull=False).order_by('next_run_time').first().next_run_time
         except AttributeError:  # no active jobs
             return None
 
     def get_all_jobs(self):
-        jobs = self._get_jobs()
+        self._flush()
+        jobs = self._load(DjangoJob.objects.order_by('next_run_time').values_list('job_id', 'version', 'next_run_time'))
         self._fix_paused_jobs_sorting(jobs)
         return jobs
 
     def add_job(self, job):
+        job_state = job.__getstate__()
+        version = uuid.uuid4().hex
         try:
             DjangoJob.objects.create(
                 job_id=job.id,
                 next_run_time=job.next_run_time,
-                job_state=job.__getstate__()
+                trigger=str(job.trigger),
+                job_state=job_state,
+                version=version
             )
-        except:
+        except IntegrityError:
             raise ConflictingIdError(job.id)
+        self._jobs[job.id] = (version, job, self._snapshot(job_state))
 
     def update_job(self, job):
-        DjangoJob.objects.filter(job_id=job.id).update(
+        job_state = job.__getstate__()
+        cached = self._jobs.get(job.id)
+        if cached and cached[2] == self._snapshot(job_state) and self._scheduler and self._scheduler.state == STATE_RUNNING:
+            # Only the next run time changed
+            self._pending_run_times[job.id] = job.next_run_time
+            return
+
+        self._pending_run_times.pop(job.id, None)
+        self._jobs.pop(job.id, None)
+        updated = DjangoJob.objects.filter(job_id=job.id).update(
             next_run_time=job.next_run_time,
-            job_state=job.__getstate__()
+            trigger=str(job.trigger),
+            job_state=job_state,
+            version=uuid.uuid4().hex
         )
+        if updated == 0:
+            raise JobLookupError(job.id)
 
     def remove_job(self, job_id):
+        self._pending_run_times.pop(job_id, None)
+        self._jobs.pop(job_id, None)
         deleted, _ = DjangoJob.objects.filter(job_id=job_id).delete()
         if deleted == 0:
             raise JobLookupError(job_id)
 
     def remove_all_jobs(self):
-        DjangoJob.objects.delete()
+        self._pending_run_times.clear()
+        self._jobs.clear()
+        DjangoJob.objects.all().delete()
+
+    def _flush(self):
+        if not self._pending_run_times:
+            return
+
+        pending, self._pending_run_times = self._pending_run_times, {}
+        DjangoJob.objects.filter(job_id__in=pending.keys()).update(next_run_time=Case(
+            *[When(job_id=job_id, then=Value(next_run_time)) for job_id, next_run_time in pending.iteritems()],
+            output_field=DateTimeField()))
+
+    @staticmethod
+    def _snapshot(job_state):
+        snapshot = dict(job_state)
+        snapshot.pop('next_run_time', None)
+        return snapshot
+
+    def _load(self, rows):
+        rows = list(rows)
+        stale = [job_id for job_id, version, next_run_time in rows
+            if job_id not in self._jobs or self._jobs[job_id][0] != version]
+        job_states = dict(DjangoJob.objects.filter(job_id__in=stale).values_list('job_id', 'job_state')) if stale else {}
+
+        jobs = []
+        failed_job_ids = set()
+        for job_id, version, next_run_time in rows:
+            if job_id in job_states:
+                try:
+                    job = self._reconstitute_job(job_states[job_id])
+                except:
+                    self._logger.exception('Unable to restore job "%s" -- removing it', job_id)
+                    failed_job_ids.add(job_id)
+                    continue
+                self._jobs[job_id] = (version, job, self._snapshot(job.__getstate__()))
+            elif job_id in self._jobs:
+                job = self._jobs[job_id][1]
+            else:
+                # Removed since the rows were read
+                continue
+
+            # The column is the source of truth, the pickled state may lag behind
+            job.next_run_time = next_run_time
+            jobs.append(job)
+
+        # Remove all the jobs we failed to restore
+        if failed_job_ids:
+            DjangoJob.objects.filter(job_id__in=failed_job_ids).delete()
+
+        return jobs
 
     def _reconstitute_job(self, job_state):
         from apscheduler.job import Job
@@ -61,19 +153,3 @@ class DjangoJobStore(BaseJobStore):
         job._scheduler = self._scheduler
         job._jobstore_alias = self._alias
         return job
-
-    def _get_jobs(self, **filters):
-        job_states = DjangoJob.objects.filter(**filters).values_list('job_id', 'job_state')
-        jobs = []
-        failed_job_ids = set()
-        for job_id, job_state in job_states:
-            try:
-                jobs.append(self._reconstitute_job(job_state))
-            except:
-                self._logger.exception('Unable to restore job "%s" -- removing it', job_id)
-                failed_job_ids.add(job_id)
-
-        # Remove all the jobs we failed to restore
-        DjangoJob.objects.filter(job_id__in=failed_job_ids).delete()
-
-        return jobs
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+import os, socket, threading, uuid, warnings
+
+class LeaderElector(threading.Thread):
+
+    """
+    Keeps a lease row in the database so a single process across all the
+    nodes runs the scheduler. The other processes keep their scheduler
+    paused, so they can still add and remove jobs in the job store.
+    """
+
+    def __init__(self, scheduler, name='scheduler', heartbeat=10, on_elected=None):
+        super(LeaderElector, self).__init__(name='rss-leader-elector')
+        self.daemon = True
+        self.scheduler = scheduler
+        self.lease_name = name
+        self.heartbeat = heartbeat
+        self.ttl = timedelta(seconds=heartbeat * 3)
+        self.identity = '%s:%s:%s' % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self.on_elected = on_elected
+        self.is_leader = False
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                leader = self._renew()
+            except Exception as e:
+                warnings.warn('Unable to renew the scheduler lease: %s' % str(e))
+                leader = False
+            finally:
+                connection.close()
+
+            if leader and not self.is_leader:
+                warnings.warn('Process %s is now running the scheduler' % self.identity)
+                self.scheduler.resume()
+                if self.on_elected:
+                    try:
+                        self.on_elected()
+                    except Exception as e:
+                        warnings.warn('Error preparing the scheduler of process %s: %s' % (self.identity, str(e)))
+                    finally:
+                        connection.close()
+            elif not leader and self.is_leader:
+                warnings.warn('Process %s lost the scheduler lease' % self.identity)
+                self.scheduler.pause()
+            elif leader:
+                # Pick up the jobs added by other processes since the last heartbeat
+                self.scheduler.wakeup()
+            self.is_leader = leader
+
+            self._stopped.wait(self.heartbeat)
+
+    def stop(self):
+        """
+        Stops the elector and releases the lease so another process takes over right away
+        """
+        self._stopped.set()
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                from .models import SchedulerLease
+                SchedulerLease.objects.filter(name=self.lease_name, owner=self.identity).update(expires_at=timezone.now())
+            except Exception as e:
+                warnings.warn('Unable to release the scheduler lease: %s' % str(e))
+
+    def _renew(self):
+        from .models import SchedulerLease
+        now = timezone.now()
+        updated = SchedulerLease.objects.filter(name=self.lease_name).filter(Q(owner=self.identity) | Q(expires_at__lt=now)).update(
+            owner=self.identity, expires_at=now + self.ttl)
+        if updated:
+            return True
+
+        try:
+            with transaction.atomic():
+                SchedulerLease.objects.create(name=self.lease_name, owner=self.identity, expires_at=now + self.ttl)
+            return True
+        except IntegrityError:
+            # Another process holds the lease
+            return False
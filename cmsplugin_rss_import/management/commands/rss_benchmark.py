@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from xml.sax.saxutils import escape
+import json, resource, threading, time, uuid, StringIO
+
+NAMESPACE_URI = 'http://example.com/rss-benchmark/ns%s'
+
+def build_feed(base_url, items, fields, namespaces, images):
+    """
+    Returns a synthetic RSS feed and the processing settings to import it. The
+    extra fields are spread over the namespaces and every image field is an
+    enclosure pointing to a distinct image of the stub server.
+    """
+    prefixes = ['ns%s' % n for n in range(namespaces)]
+    paths = []
+    for n in range(fields):
+        paths.append('%s:field%s' % (prefixes[n % namespaces], n) if namespaces else 'field%s' % n)
+
+    declarations = ''.join(' xmlns:%s="%s"' % (prefix, NAMESPACE_URI % n) for n, prefix in enumerate(prefixes))
+    feed = StringIO.StringIO()
+    feed.write('<?xml version="1.0" encoding="utf-8"?>\n<rss version="2.0"%s><channel><title>Benchmark</title>' % declarations)
+    for i in range(items):
+        feed.write('<item><guid>item-%s</guid><title>%s</title>' % (i, escape('Item %s & co' % i)))
+        for n, path in enumerate(paths):
+            feed.write('<%s>%s</%s>' % (path, escape('Value %s of field %s ' % (i, n) * 4), path))
+        for n in range(images):
+            feed.write('<enclosure%s url="%s/images/%s-%s.png" type="image/png"/>' % (n, base_url, i, n))
+        feed.write('</item>')
+    feed.write('</channel></rss>')
+
+    process_settings = {
+        'wrapper': './channel/item',
+        'unique': ['guid'],
+        'fields': [{'source': 'guid'}, {'source': 'title'}] +
+            [{'source': path, 'target': 'field%s' % n} for n, path in enumerate(paths)] +
+            [{'source': 'enclosure%s' % n, 'type': 'image', 'empty': True, 'attributes': [{'source': 'url'}], 'location': 'url'}
+                for n in range(images)],
+    }
+    return feed.getvalue(), process_settings
+
+def build_image(name):
+    """
+    Returns a small PNG whose colour depends on its name, so every image has a different content
+    """
+    from PIL import Image
+    seed = abs(hash(name))
+    image = Image.new('RGB', (320, 240), (seed % 256, (seed >> 8) % 256, (seed >> 16) % 256))
+    content = StringIO.StringIO()
+    image.save(content, 'PNG')
+    return content.getvalue()
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/feed.xml':
+            body, content_type = self.server.feed, 'application/rss+xml'
+        elif self.path.startswith('/images/'):
+            body, content_type = build_image(self.path), 'image/png'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def peak_memory_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the import of a synthetic feed served locally and the rendering of its feed plugin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=500,
+            help='Items of the synthetic feed')
+        parser.add_argument('--fields', type=int, default=5,
+            help='Extra text fields of every item')
+        parser.add_argument('--namespaces', type=int, default=0,
+            help='Namespaces the extra fields are spread over')
+        parser.add_argument('--images', type=int, default=0,
+            help='Image fields of every item')
+        parser.add_argument('--stream', action='store_true',
+            help='Parses the feed in stream mode')
+        parser.add_argument('--render-rows', type=int, default=10000,
+            help='Published imports of the source when measuring the rendering')
+        parser.add_argument('--render-amount', type=int, default=20,
+            help='Items rendered by the feed plugin')
+        parser.add_argument('--repeat', type=int, default=20,
+            help='Renders measured for every cache state')
+        parser.add_argument('--output', default=None,
+            help='File to write the JSON results to, instead of the standard output')
+
+    def handle(self, *args, **options):
+        from cmsplugin_rss_import.models import IntervalSchedule, RSSSource
+
+        server = StubServer(('127.0.0.1', 0), StubHandler)
+        server_thread = threading.Thread(target=server.serve_forever, name='rss-benchmark-stub')
+        server_thread.daemon = True
+        server_thread.start()
+        base_url = 'http://127.0.0.1:%s' % server.server_port
+        server.feed, process_settings = build_feed(base_url, options['items'], options['fields'], options['namespaces'], options['images'])
+        process_settings['stream'] = options['stream']
+
+        interval, created = IntervalSchedule.objects.get_or_create(frequency=1, period='hours')
+        source = RSSSource.objects.create(name='benchmark-%s' % uuid.uuid4().hex[:8], url=base_url + '/feed.xml',
+            settings=process_settings, task='process_rss', interval=interval, enabled=False)
+
+        results = {
+            'options': dict((key, options[key]) for key in ('items', 'fields', 'namespaces', 'images', 'stream', 'render_rows', 'render_amount', 'repeat')),
+            'feed_bytes': len(server.feed),
+        }
+        try:
+            results['import'] = self._measure_import(source)
+            # Same feed again without the watermark, every item goes through the duplicate check
+            RSSSource.objects.filter(pk=source.pk).update(content_digest='', watermark='')
+            results['reimport'] = self._measure_import(source)
+            results['render'] = self._measure_render(source, options['render_rows'], options['render_amount'], options['repeat'])
+        finally:
+            self._cleanup(source)
+            server.shutdown()
+            server.server_close()
+
+        output = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def _measure_import(self, source):
+        from cmsplugin_rss_import.models import RSSRun
+        from cmsplugin_rss_import.tasks import RssSourceProcessor
+
+        # The run is executed in this thread, so its queries go through this connection
+        with CaptureQueriesContext(connection) as queries:
+            started = time.time()
+            RssSourceProcessor(source.pk).run()
+            elapsed = time.time() - started
+
+        run = RSSRun.objects.filter(source=source).order_by('-started_at').first()
+        seen = run.items_seen if run else 0
+        return {
+            'seconds': elapsed,
+            'items_per_second': seen / elapsed if elapsed else None,
+            'queries': len(queries),
+            'queries_per_item': float(len(queries)) / seen if seen else None,
+            'peak_memory_kb': peak_memory_kb(),
+            'status': run.status if run else None,
+            'items': {'seen': seen, 'new': run.items_new, 'duplicated': run.items_duplicated, 'failed': run.items_failed} if run else None,
+            'phases': run.timings if run else None,
+        }
+
+    def _measure_render(self, source, rows, amount, repeat):
+        from cmsplugin_rss_import.constants import DEFAULT_FEED_PLUGIN_TEMPLATE
+        from cmsplugin_rss_import.models import RSSFeed, RSSImport, invalidate_published_items
+
+        # The imported items are cloned to grow the table
+        contents = list(RSSImport.objects.filter(source=source).values_list('content', flat=True)[:100]) or [{'title': 'Item'}]
+        for start in range(0, rows, 1000):
+            RSSImport.objects.bulk_create([RSSImport(source=source, content=contents[n % len(contents)], fingerprint=uuid.uuid4().hex,
+                status='complete', enabled=True) for n in range(start, min(rows, start + 1000))])
+
+        results = {}
+        for state in ('cold', 'warm'):
+            timings = []
+            query_counts = []
+            for n in range(repeat):
+                if state == 'cold':
+                    invalidate_published_items(source.pk)
+                feed = RSSFeed(source=source, amount_to_render=amount)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.time()
+                    render_to_string(DEFAULT_FEED_PLUGIN_TEMPLATE, {'instance': feed})
+                    timings.append(time.time() - started)
+                query_counts.append(len(queries))
+
+            results[state] = {
+                'first_ms': timings[0] * 1000,
+                'median_ms': percentile(timings, 0.5) * 1000,
+                'p95_ms': percentile(timings, 0.95) * 1000,
+                'queries': max(query_counts),
+            }
+        results['peak_memory_kb'] = peak_memory_kb()
+        return results
+
+    def _cleanup(self, source):
+        from filer.models.foldermodels import Folder
+        from filer.models.imagemodels import Image
+
+        # The downloaded images are deleted right away instead of waiting for the media collector
+        source.delete()
+        folders = Folder.objects.filter(name=source.name, parent__name='RSS Files')
+        Image.objects.filter(folder__in=folders).delete()
+        folders.delete()
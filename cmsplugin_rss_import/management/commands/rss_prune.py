@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+class Command(BaseCommand):
+    help = 'Expires the imports of the sources beyond their retention limits, deleting the images only they use and the expired imports gone from the feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', type=int, action='append', dest='sources', default=None,
+            help='Pk of a source to prune, can be repeated (defaults to every source with retention limits)')
+        parser.add_argument('--batch-size', type=int, default=None,
+            help='Imports expired per batch')
+        parser.add_argument('--dry-run', action='store_true',
+            help='Only reports what would be expired and deleted')
+
+    def handle(self, *args, **options):
+        from cmsplugin_rss_import.constants import RETENTION_BATCH_SIZE
+        from cmsplugin_rss_import.models import RSSSource
+        from cmsplugin_rss_import.retention import prune_source, purge_expired
+
+        sources = RSSSource.objects.filter(Q(keep_items__isnull=False) | Q(keep_days__isnull=False))
+        if options['sources']:
+            sources = sources.filter(pk__in=options['sources'])
+
+        action = 'Would expire' if options['dry_run'] else 'Expired'
+        total_items = total_images = total_purged = 0
+        for source in sources:
+            deleted_items, deleted_images = prune_source(source, options['dry_run'], options['batch_size'] or RETENTION_BATCH_SIZE)
+            purged = purge_expired(source, options['dry_run'], options['batch_size'] or RETENTION_BATCH_SIZE)
+            total_items += deleted_items
+            total_images += deleted_images
+            total_purged += purged
+            self.stdout.write('%s: %s %s items, deleting %s images and %s expired items' % (source.name, action, deleted_items, deleted_images, purged))
+        self.stdout.write('%s %s items, deleting %s images and %s expired items in total' % (action, total_items, total_images, total_purged))
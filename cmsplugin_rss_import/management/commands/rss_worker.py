@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import json, signal, threading
+
+class Command(BaseCommand):
+    help = 'Runs the RSS import scheduler and processing pool as a standalone worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+            help='Maximum number of sources processed at the same time (defaults to RSS_IMPORT_MAX_WORKERS)')
+        parser.add_argument('--status-interval', type=int, default=30,
+            help='Seconds between status reports')
+        parser.add_argument('--health-file', default=None,
+            help='File rewritten with the status on every report, for health and readiness probes')
+        parser.add_argument('--drain-timeout', type=int, default=300,
+            help='Seconds to wait for the runs in progress when stopping')
+
+    def handle(self, *args, **options):
+        from cmsplugin_rss_import.apps import scheduler, start_leader_election
+        from cmsplugin_rss_import.tasks import processing_pool
+
+        if options['concurrency']:
+            processing_pool.max_workers = options['concurrency']
+
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            stopping.set()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        elector = start_leader_election()
+        self.stdout.write('RSS worker started with %s workers' % processing_pool.max_workers)
+
+        while not stopping.is_set():
+            self._report(elector, scheduler, processing_pool, options['health_file'], ready=True)
+            stopping.wait(options['status_interval'])
+
+        # Hand the scheduler over to another process and let the runs in progress finish
+        self.stdout.write('Stopping RSS worker, draining %s runs' % processing_pool.stats()['pending'])
+        elector.stop()
+        scheduler.pause()
+        self._report(elector, scheduler, processing_pool, options['health_file'], ready=False)
+        if processing_pool.wait(options['drain_timeout']):
+            self.stdout.write('RSS worker stopped')
+        else:
+            self.stderr.write('RSS worker stopped with %s runs unfinished' % processing_pool.stats()['pending'])
+
+    def _report(self, elector, scheduler, processing_pool, health_file, ready):
+        status = dict(processing_pool.stats(), **{
+            'ready': ready,
+            'leader': elector.is_leader,
+            'scheduler_state': scheduler.state,
+            'timestamp': timezone.now().isoformat(),
+        })
+        self.stdout.write(json.dumps(status))
+        if health_file:
+            with open(health_file, 'w') as f:
+                f.write(json.dumps(status))
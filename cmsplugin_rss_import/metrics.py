@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .constants import DEFAULT_RUN_HISTORY
+import socket, threading, time, warnings
+
+PHASES = ('fetch', 'parse', 'extract', 'dedup', 'write', 'images')
+COUNTERS = ('seen', 'new', 'duplicated', 'failed')
+
+class RunMetrics(object):
+
+    """
+    Timings in seconds of the phases of a processing run and counters of its items
+    """
+
+    def __init__(self, source_id):
+        self.source_id = source_id
+        self.started_at = timezone.now()
+        self.duration = None
+        self.status = 'success'
+        self.error = ''
+        self.timings = dict((phase, 0.0) for phase in PHASES)
+        self.counters = dict((counter, 0) for counter in COUNTERS)
+        self._started = time.time()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.time() - started
+
+    def timed(self, name, iterable):
+        """
+        Yields the values of an iterable adding the time spent producing them to a phase
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    value = next(iterator)
+                except StopIteration:
+                    return
+            yield value
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def fail(self, error):
+        self.status = 'error'
+        self.error = str(error)
+
+    def finish(self):
+        self.duration = time.time() - self._started
+
+
+class MemoryExporter(object):
+
+    """
+    Keeps the last exported runs in memory, a stand-in for real exporters in tests and the shell
+    """
+
+    def __init__(self, max_runs=1000):
+        self.runs = deque(maxlen=max_runs)
+
+    def export(self, metrics):
+        self.runs.append(metrics)
+
+
+class StatsdExporter(object):
+
+    """
+    Sends the timings and counters of every run to a statsd server over UDP
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='rss_import'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def export(self, metrics):
+        prefix = '%s.source_%s' % (self.prefix, metrics.source_id)
+        lines = ['%s.duration:%d|ms' % (prefix, metrics.duration * 1000), '%s.runs.%s:1|c' % (prefix, metrics.status)]
+        lines.extend('%s.%s:%d|ms' % (prefix, phase, timing * 1000) for phase, timing in metrics.timings.iteritems())
+        lines.extend('%s.items.%s:%d|c' % (prefix, counter, value) for counter, value in metrics.counters.iteritems())
+        self._socket.sendto('\n'.join(lines), self.address)
+
+
+_exporters = None
+_exporters_lock = threading.Lock()
+
+def get_exporters():
+    """
+    Returns the exporters of the RSS_IMPORT_METRICS_EXPORTERS setting, a list
+    of dotted paths or (dotted path, keyword arguments) pairs
+    """
+    global _exporters
+    with _exporters_lock:
+        if _exporters is None:
+            _exporters = []
+            for exporter in getattr(settings, 'RSS_IMPORT_METRICS_EXPORTERS', []):
+                path, kwargs = (exporter, {}) if isinstance(exporter, basestring) else exporter
+                _exporters.append(import_string(path)(**kwargs))
+        return _exporters
+
+def register_exporter(exporter):
+    """
+    Adds an exporter, any object with an export(metrics) method, to the configured ones
+    """
+    exporters = get_exporters()
+    with _exporters_lock:
+        exporters.append(exporter)
+
+def export_run(metrics):
+    """
+    Stores a finished run and hands it to the exporters
+    """
+    from .models import RSSRun
+    try:
+        RSSRun.objects.create(source_id=metrics.source_id, started_at=metrics.started_at, duration=metrics.duration,
+            status=metrics.status, error=metrics.error, timings=metrics.timings,
+            items_seen=metrics.counters['seen'], items_new=metrics.counters['new'],
+            items_duplicated=metrics.counters['duplicated'], items_failed=metrics.counters['failed'])
+
+        # Keep only the last runs of the source
+        history = getattr(settings, 'RSS_IMPORT_RUN_HISTORY', DEFAULT_RUN_HISTORY)
+        oldest = RSSRun.objects.filter(source_id=metrics.source_id).values_list('started_at', flat=True)[history:history + 1]
+        if oldest:
+            RSSRun.objects.filter(source_id=metrics.source_id, started_at__lte=oldest[0]).delete()
+    except Exception as e:
+        warnings.warn('Error storing the run of source %s: %s' % (metrics.source_id, str(e)))
+
+    for exporter in get_exporters():
+        try:
+            exporter.export(metrics)
+        except Exception as e:
+            warnings.warn('Error exporting the run of source %s: %s' % (metrics.source_id, str(e)))
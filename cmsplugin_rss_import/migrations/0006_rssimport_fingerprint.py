@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import migrations, models
+import hashlib, json
+
+
+def build_fingerprint(content, unique_fields):
+    # Frozen copy of models.build_fingerprint so later changes don't alter this migration
+    if not unique_fields or not isinstance(content, dict):
+        values = content
+    else:
+        values = [content.get(field) for field in unique_fields]
+    return hashlib.sha1(json.dumps(values, sort_keys=True)).hexdigest()
+
+
+def get_image_ids(content):
+    multimedia = content.get('multimedia') if isinstance(content, dict) else None
+    if not isinstance(multimedia, dict):
+        return set()
+    return set(value for value in multimedia.values() if value is not None)
+
+
+def backfill_fingerprints(apps, schema_editor):
+    RSSSource = apps.get_model('cmsplugin_rss_import', 'RSSSource')
+    RSSImport = apps.get_model('cmsplugin_rss_import', 'RSSImport')
+    RSSFeed = apps.get_model('cmsplugin_rss_import', 'RSSFeed')
+    Image = apps.get_model('filer', 'Image')
+
+    for source in RSSSource.objects.all():
+        unique_fields = source.settings.get('unique', []) if isinstance(source.settings, dict) else []
+
+        seen = set()
+        duplicated = []
+        kept_images = set()
+        duplicated_images = set()
+        for pk, content in RSSImport.objects.filter(source=source).order_by('pk').values_list('pk', 'content').iterator():
+            fingerprint = build_fingerprint(content, unique_fields)
+            if fingerprint in seen:
+                # The old importer kept only the first match of a unique set
+                duplicated.append(pk)
+                duplicated_images.update(get_image_ids(content))
+                continue
+
+            seen.add(fingerprint)
+            kept_images.update(get_image_ids(content))
+            RSSImport.objects.filter(pk=pk).update(fingerprint=fingerprint)
+
+        if duplicated:
+            # Historical models send no delete signals, so the images and caches of the rows are cleaned up here
+            RSSImport.objects.filter(pk__in=duplicated).delete()
+            orphans = list(duplicated_images - kept_images)
+            for start in range(0, len(orphans), 500):
+                Image.objects.filter(pk__in=orphans[start:start + 500]).delete()
+            for feed_id in RSSFeed.objects.filter(source=source).values_list('pk', flat=True):
+                cache.delete(make_template_fragment_key('rss:feed_%s' % feed_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filer', '__first__'),
+        ('cmsplugin_rss_import', '0005_auto_20170421_1350'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rssimport',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=40, null=True, verbose_name='Fingerprint'),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='rssimport',
+            unique_together=set([('source', 'fingerprint')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0006_rssimport_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rsssource',
+            name='etag',
+            field=models.CharField(blank=True, default='', editable=False, max_length=250, verbose_name='ETag'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='last_modified',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Last modified'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='content_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40, verbose_name='Content digest'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_images(apps, schema_editor):
+    RSSImport = apps.get_model('cmsplugin_rss_import', 'RSSImport')
+    Image = apps.get_model('filer', 'Image')
+    Through = RSSImport.images.through
+
+    references = []
+    for pk, content in RSSImport.objects.values_list('pk', 'content').iterator():
+        if isinstance(content, dict) and content.get('multimedia'):
+            for image_id in set(content['multimedia'].values()):
+                if image_id is not None:
+                    references.append((pk, image_id))
+
+    for start in range(0, len(references), 500):
+        batch = references[start:start + 500]
+        existing = set(Image.objects.filter(pk__in=[image_id for pk, image_id in batch]).values_list('pk', flat=True))
+        Through.objects.bulk_create([Through(rssimport_id=pk, image_id=image_id) for pk, image_id in batch if image_id in existing])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filer', '__first__'),
+        ('cmsplugin_rss_import', '0007_rsssource_http_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RSSMedia',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(editable=False, max_length=40, unique=True)),
+                ('url', models.TextField(editable=False, verbose_name='Url')),
+                ('sha1', models.CharField(db_index=True, editable=False, max_length=40, verbose_name='SHA-1')),
+                ('fetched_at', models.DateTimeField(editable=False, verbose_name='Last download date')),
+                ('used_at', models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Last use date')),
+                ('image', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='rss_media', to='filer.Image')),
+            ],
+            options={
+                'verbose_name': 'RSS Media',
+                'verbose_name_plural': 'RSS Media',
+            },
+        ),
+        migrations.AddField(
+            model_name='rssimport',
+            name='images',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='rss_imports', to='filer.Image', verbose_name='Images'),
+        ),
+        migrations.RunPython(backfill_images, migrations.RunPython.noop),
+    ]
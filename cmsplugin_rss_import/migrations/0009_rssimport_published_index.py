@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0008_rssmedia_rssimport_images'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rssimport',
+            name='content',
+            field=jsonfield.fields.JSONField(editable=False, verbose_name='Content imported'),
+        ),
+        migrations.AlterIndexTogether(
+            name='rssimport',
+            index_together=set([('source', 'status', 'enabled', 'timestamp')]),
+        ),
+    ]
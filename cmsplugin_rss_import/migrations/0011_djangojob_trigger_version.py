@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0010_schedulerlease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='djangojob',
+            name='trigger',
+            field=models.CharField(blank=True, default='', editable=False, max_length=250),
+        ),
+        migrations.AddField(
+            model_name='djangojob',
+            name='version',
+            field=models.CharField(default='', editable=False, max_length=32),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0011_djangojob_trigger_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rsssource',
+            name='adaptive',
+            field=models.BooleanField(default=False, help_text='Polls more often while the source publishes new items and less often while it does not, starting from the interval schedule', verbose_name='Adaptive interval'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='min_interval',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Minimum interval (seconds)'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='max_interval',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Maximum interval (seconds)'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='current_interval',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Current interval (seconds)'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='new_items_rate',
+            field=models.FloatField(default=0, editable=False, verbose_name='Average new items per run'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='unchanged_rate',
+            field=models.FloatField(default=0, editable=False, verbose_name='Ratio of runs without changes'),
+        ),
+    ]
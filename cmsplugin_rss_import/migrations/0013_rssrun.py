@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0012_rsssource_adaptive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RSSRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(editable=False, verbose_name='Start date')),
+                ('duration', models.FloatField(editable=False, verbose_name='Duration (seconds)')),
+                ('status', models.CharField(choices=[('success', 'Success'), ('unchanged', 'Unchanged'), ('error', 'Error')], editable=False, max_length=20, verbose_name='Status')),
+                ('items_seen', models.PositiveIntegerField(default=0, editable=False, verbose_name='Items seen')),
+                ('items_new', models.PositiveIntegerField(default=0, editable=False, verbose_name='New items')),
+                ('items_duplicated', models.PositiveIntegerField(default=0, editable=False, verbose_name='Duplicated items')),
+                ('items_failed', models.PositiveIntegerField(default=0, editable=False, verbose_name='Failed items')),
+                ('timings', jsonfield.fields.JSONField(default=dict, editable=False, verbose_name='Timings (seconds)')),
+                ('error', models.TextField(blank=True, default='', editable=False, verbose_name='Error')),
+                ('source', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='cmsplugin_rss_import.RSSSource')),
+            ],
+            options={
+                'ordering': ('-started_at',),
+                'verbose_name': 'RSS Run',
+                'verbose_name_plural': 'RSS Runs',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='rssrun',
+            index_together=set([('source', 'started_at')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0013_rssrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rsssource',
+            name='keep_items',
+            field=models.PositiveIntegerField(blank=True, help_text='Older items are deleted with their images once there are more', null=True, verbose_name='Maximum items kept'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='keep_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Items imported before are deleted with their images', null=True, verbose_name='Maximum age of the items kept (days)'),
+        ),
+        migrations.AlterField(
+            model_name='rssimport',
+            name='status',
+            field=models.CharField(choices=[(b'scheduled', 'Scheduled'), (b'processing', 'Processing'), (b'complete', 'Complete'), (b'expired', 'Expired')], db_index=True, default=b'scheduled', editable=False, max_length=20, verbose_name='Status'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0014_rsssource_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rssfeed',
+            name='thumbnail_sizes',
+            field=models.CharField(blank=True, default='640x480', help_text='Comma separated sizes, like 640x480, of the cropped thumbnails generated when the images are imported. The default template renders the first one', max_length=200, verbose_name='Thumbnail sizes'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0015_rssfeed_thumbnail_sizes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rsssource',
+            name='watermark',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40, verbose_name='Fingerprint of the newest item processed'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='full_scan_date',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Last full scan date'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    RSSSource = apps.get_model('cmsplugin_rss_import', 'RSSSource')
+    RSSImport = apps.get_model('cmsplugin_rss_import', 'RSSImport')
+
+    for source_id in RSSSource.objects.values_list('pk', flat=True):
+        counts = dict(RSSImport.objects.filter(source_id=source_id).order_by().values_list('status').annotate(count=models.Count('pk')))
+        RSSSource.objects.filter(pk=source_id).update(
+            total_items=sum(counts.values()),
+            complete_items=counts.get('complete', 0),
+            scheduled_items=counts.get('scheduled', 0),
+            processing_items=counts.get('processing', 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cmsplugin_rss_import', '0016_rsssource_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rsssource',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Total items'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='complete_items',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Complete items'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='scheduled_items',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Scheduled items'),
+        ),
+        migrations.AddField(
+            model_name='rsssource',
+            name='processing_items',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Processing items'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
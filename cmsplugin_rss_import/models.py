@@ -1,24 +1,39 @@
 # -*- coding: utf-8 -*-
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-from cms.cache import invalidate_cms_page_cache
 from cms.models import CMSPlugin
 from django.conf import settings as dj_settings
+from django.core.cache import cache, caches, InvalidCacheBackendError
+from django.core.cache.utils import make_template_fragment_key
 from django.core.exceptions import ValidationError, ObjectDoesNotExist, MultipleObjectsReturned
 from django.db import models
-from django.template import Template
-from django.utils import timezone as date
+from django.template import Context, Engine, Template
+from django.utils import timezone as date, translation
 from django.utils.translation import ugettext_lazy as _
 from jsonfield import JSONField
 from picklefield.fields import PickledObjectField
 from .apps import scheduler
-from .constants import CUSTOM_TEMPLATE_DIR, DEFAULT_FEED_PLUGIN_TEMPLATE
+from .constants import DEFAULT_FEED_PLUGIN_TEMPLATE, DEFAULT_THUMBNAIL_SIZE, PUBLISHED_ITEMS_SIZE, DEFAULT_PRERENDER_TIMEOUT, ADAPTIVE_SMOOTHING, ADAPTIVE_TARGET_ITEMS, ADAPTIVE_MAX_STEP, DEFAULT_ADAPTIVE_MIN_INTERVAL, DEFAULT_ADAPTIVE_MAX_INTERVAL
 from .decorators import task
-import os.path, warnings
+import hashlib, json, re, warnings
+
+def build_fingerprint(content, unique_fields):
+    """
+    Returns a stable digest of the unique values of an imported item, or of
+    the whole item when there are no unique fields
+    """
+    if not unique_fields or not isinstance(content, dict):
+        values = content
+    else:
+        values = [content.get(field) for field in unique_fields]
+    return hashlib.sha1(json.dumps(values, sort_keys=True)).hexdigest()
 
 class DjangoJob(models.Model):
     job_id = models.CharField(max_length=250, unique=True, db_index=True, editable=False)
     next_run_time = models.DateTimeField(db_index=True, blank=True, null=True, editable=False)
+    trigger = models.CharField(max_length=250, blank=True, default='', editable=False)
+    # Token written with every change of the job state, unique across recreations of the row
+    version = models.CharField(max_length=32, default='', editable=False)
     job_state = PickledObjectField(blank=True, null=True, editable=False)
 
     def __str__(self):
@@ -28,6 +43,14 @@ class DjangoJob(models.Model):
     class Meta:
         ordering = ('next_run_time', )
 
+class SchedulerLease(models.Model):
+    name = models.CharField(max_length=50, unique=True, editable=False)
+    owner = models.CharField(max_length=250, editable=False)
+    expires_at = models.DateTimeField(editable=False)
+
+    def __str__(self):
+        return '%s (%s until %s)' % (self.name, self.owner, self.expires_at)
+
 class IntervalSchedule(models.Model):
     PERIOD_CHOICES = (
         ('seconds', _('Seconds')),
@@ -159,6 +182,27 @@ class RSSSource(models.Model):
     end_date = models.DateTimeField(verbose_name=_('End date'), blank=True, null=True)
     reverse = models.BooleanField(verbose_name=_('Reverse order to process'), default=False)
 
+    etag = models.CharField(max_length=250, editable=False, blank=True, default='', verbose_name=_('ETag'))
+    last_modified = models.CharField(max_length=100, editable=False, blank=True, default='', verbose_name=_('Last modified'))
+    content_digest = models.CharField(max_length=40, editable=False, blank=True, default='', verbose_name=_('Content digest'))
+    watermark = models.CharField(max_length=40, editable=False, blank=True, default='', verbose_name=_('Fingerprint of the newest item processed'))
+    full_scan_date = models.DateTimeField(editable=False, null=True, blank=True, verbose_name=_('Last full scan date'))
+
+    adaptive = models.BooleanField(verbose_name=_('Adaptive interval'), default=False, help_text=_('Polls more often while the source publishes new items and less often while it does not, starting from the interval schedule'))
+    min_interval = models.PositiveIntegerField(verbose_name=_('Minimum interval (seconds)'), null=True, blank=True)
+    max_interval = models.PositiveIntegerField(verbose_name=_('Maximum interval (seconds)'), null=True, blank=True)
+    current_interval = models.PositiveIntegerField(editable=False, null=True, blank=True, verbose_name=_('Current interval (seconds)'))
+    new_items_rate = models.FloatField(editable=False, default=0, verbose_name=_('Average new items per run'))
+    unchanged_rate = models.FloatField(editable=False, default=0, verbose_name=_('Ratio of runs without changes'))
+
+    total_items = models.PositiveIntegerField(editable=False, default=0, verbose_name=_('Total items'))
+    complete_items = models.PositiveIntegerField(editable=False, default=0, verbose_name=_('Complete items'))
+    scheduled_items = models.PositiveIntegerField(editable=False, default=0, verbose_name=_('Scheduled items'))
+    processing_items = models.PositiveIntegerField(editable=False, default=0, verbose_name=_('Processing items'))
+
+    keep_items = models.PositiveIntegerField(verbose_name=_('Maximum items kept'), null=True, blank=True, help_text=_('Older items are deleted with their images once there are more'))
+    keep_days = models.PositiveIntegerField(verbose_name=_('Maximum age of the items kept (days)'), null=True, blank=True, help_text=_('Items imported before are deleted with their images'))
+
     def __init__(self, *args, **kwargs):
         super(RSSSource, self).__init__(*args, **kwargs)
 
@@ -176,6 +220,18 @@ class RSSSource(models.Model):
             if self.interval.frequency < 60 and self.interval.period == 'seconds':
                 raise ValidationError(_('An interval cannot be less than 60 seconds'), code='invalid')
 
+        if self.adaptive and not self.interval:
+            raise ValidationError(_('The adaptive interval needs an interval schedule to start from'), code='invalid')
+
+        if self.min_interval is not None and self.min_interval < 60:
+            raise ValidationError(_('The minimum interval cannot be less than 60 seconds'), code='invalid')
+
+        if self.min_interval and self.max_interval and self.max_interval < self.min_interval:
+            raise ValidationError(_('The maximum interval should be greater than the minimum interval'), code='invalid')
+
+        if self.keep_items == 0 or self.keep_days == 0:
+            raise ValidationError(_('The retention limits must be equal or greater than 1'), code='invalid')
+
         if self.start_date and self.start_date < date.now():
                 raise ValidationError(_('The start date should be after the current day and time'), code='invalid')
 
@@ -206,6 +262,16 @@ class RSSSource(models.Model):
         if len(self.settings["fields"]) == 0:
             raise ValidationError(_('You must define "fields" in the processing settings'), code='invalid')
 
+        if "stream" in self.settings and not isinstance(self.settings["stream"], bool):
+            raise ValidationError(_('The "stream" value must be either true or false'), code='invalid')
+
+        if "order" in self.settings and self.settings["order"] not in ('newest_first', 'oldest_first'):
+            raise ValidationError(_('The "order" value must be either "newest_first" or "oldest_first"'), code='invalid')
+
+        if "max_items" in self.settings:
+            if isinstance(self.settings["max_items"], bool) or not isinstance(self.settings["max_items"], int) or self.settings["max_items"] < 1:
+                raise ValidationError(_('The "max_items" value must be a number equal or greater than 1'), code='invalid')
+
         field_sources = []
 
         for field in self.settings["fields"]:
@@ -246,7 +312,7 @@ class RSSSource(models.Model):
                 raise ValidationError(_('You have another process configured with the same task and source. You should edit that process to match your new attributes'), code='invalid')
 
     def save(self, *args, **kwargs):
-        job_id = self.url + ':' + self.task
+        job_id = self.get_job_id()
         try:
             scheduler.remove_job(job_id)
         except:
@@ -259,6 +325,13 @@ class RSSSource(models.Model):
             trigger = self.crontab.create_trigger(self.start_date, self.end_date)
 
         self.last_process_date = None
+        # Settings may have changed, so the next run must process the feed again
+        self.etag = ''
+        self.last_modified = ''
+        self.content_digest = ''
+        self.watermark = ''
+        self.full_scan_date = None
+        self.current_interval = None
 
         super(RSSSource, self).save(*args, **kwargs)
         if self.enabled:
@@ -278,6 +351,48 @@ class RSSSource(models.Model):
             # For Cron intervals it is defined as 1 hour due to the estimation of the cronjob period
             return 60 * 60
 
+    def get_job_id(self):
+        return self.url + ':' + self.task
+
+    def adapt_interval(self, new_items, unchanged):
+        """
+        Updates the smoothed rates of an adaptive source and scales its interval
+        so a run finds ADAPTIVE_TARGET_ITEMS new items on average, within the source bounds.
+        Below that rate the interval widens, faster the more runs found the feed unchanged.
+        """
+        if not self.adaptive or not self.interval:
+            return
+
+        self.new_items_rate = ADAPTIVE_SMOOTHING * new_items + (1 - ADAPTIVE_SMOOTHING) * self.new_items_rate
+        self.unchanged_rate = ADAPTIVE_SMOOTHING * int(unchanged) + (1 - ADAPTIVE_SMOOTHING) * self.unchanged_rate
+
+        current = self.current_interval or self.get_period_in_seconds()
+        if self.new_items_rate >= ADAPTIVE_TARGET_ITEMS:
+            factor = float(ADAPTIVE_TARGET_ITEMS) / self.new_items_rate
+        else:
+            shortfall = 1 - self.new_items_rate / ADAPTIVE_TARGET_ITEMS
+            factor = 1 + shortfall * (1 + self.unchanged_rate) / 2
+        # A single run moves the interval at most ADAPTIVE_MAX_STEP times either way
+        factor = min(ADAPTIVE_MAX_STEP, max(1.0 / ADAPTIVE_MAX_STEP, factor))
+        interval = int(current * factor)
+        interval = max(self.min_interval or getattr(dj_settings, 'RSS_IMPORT_ADAPTIVE_MIN_INTERVAL', DEFAULT_ADAPTIVE_MIN_INTERVAL), interval)
+        interval = min(self.max_interval or getattr(dj_settings, 'RSS_IMPORT_ADAPTIVE_MAX_INTERVAL', DEFAULT_ADAPTIVE_MAX_INTERVAL), interval)
+        self.current_interval = interval
+
+        # Plain update, saving the source would reset the interval
+        RSSSource.objects.filter(pk=self.pk).update(current_interval=interval,
+            new_items_rate=self.new_items_rate, unchanged_rate=self.unchanged_rate)
+
+        if interval != current:
+            try:
+                scheduler.reschedule_job(self.get_job_id(), trigger=IntervalTrigger(
+                    seconds=interval, end_date=self.end_date, timezone=dj_settings.TIME_ZONE))
+            except:
+                warnings.warn('There was an error rescheduling the job with id %s' % self.get_job_id())
+
+    def get_fingerprint(self, content):
+        return build_fingerprint(content, self.settings.get("unique"))
+
     class Meta:
         verbose_name = _('RSS Source')
         verbose_name_plural = _('RSS Sources')
@@ -292,27 +407,184 @@ class RSSImport(models.Model):
         ('scheduled', _('Scheduled')),
         ('processing', _('Processing')),
         ('complete', _('Complete')),
+        ('expired', _('Expired')),
     )
 
     source = models.ForeignKey(RSSSource, on_delete=models.CASCADE, related_name=_('rss_import'), editable=False, db_index=True)
     timestamp = models.DateTimeField(editable=False, verbose_name=_('Time Imported'), auto_now_add=True)
-    content = JSONField(editable=False, verbose_name=_('Content imported'), db_index=True)
+    content = JSONField(editable=False, verbose_name=_('Content imported'))
     enabled = models.BooleanField(verbose_name=_('Enabled'), default=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, verbose_name=_('Status'), default='scheduled', db_index=True, editable=False)
+    fingerprint = models.CharField(max_length=40, verbose_name=_('Fingerprint'), null=True, blank=True, editable=False)
+    images = models.ManyToManyField('filer.Image', related_name='rss_imports', blank=True, editable=False, verbose_name=_('Images'))
 
     class Meta:
         verbose_name = _('RSS Import')
         verbose_name_plural = _('RSS Imports')
+        unique_together = (('source', 'fingerprint'), )
+        index_together = (('source', 'status', 'enabled', 'timestamp'), )
 
     def __unicode__(self):
         return 'Import of %s (%s)' % (self.source.name, self.timestamp)
 
 
+class RSSRun(models.Model):
+    """
+    Timings and item counters of a processing run of a source
+    """
+
+    STATUS_CHOICES = (
+        ('success', _('Success')),
+        ('unchanged', _('Unchanged')),
+        ('error', _('Error')),
+    )
+
+    source = models.ForeignKey(RSSSource, on_delete=models.CASCADE, related_name='runs', editable=False)
+    started_at = models.DateTimeField(editable=False, verbose_name=_('Start date'))
+    duration = models.FloatField(editable=False, verbose_name=_('Duration (seconds)'))
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, editable=False, verbose_name=_('Status'))
+    items_seen = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Items seen'))
+    items_new = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('New items'))
+    items_duplicated = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Duplicated items'))
+    items_failed = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Failed items'))
+    timings = JSONField(editable=False, default=dict, verbose_name=_('Timings (seconds)'))
+    error = models.TextField(editable=False, blank=True, default='', verbose_name=_('Error'))
+
+    class Meta:
+        verbose_name = _('RSS Run')
+        verbose_name_plural = _('RSS Runs')
+        ordering = ('-started_at', )
+        index_together = (('source', 'started_at'), )
+
+    def __unicode__(self):
+        return 'Run of %s (%s)' % (self.source.name, self.started_at)
+
+
+class RSSMedia(models.Model):
+    """
+    Filer image downloaded from a url, used to reuse images with the same url or content
+    """
+    url_hash = models.CharField(max_length=40, unique=True, editable=False)
+    url = models.TextField(editable=False, verbose_name=_('Url'))
+    sha1 = models.CharField(max_length=40, db_index=True, editable=False, verbose_name=_('SHA-1'))
+    image = models.ForeignKey('filer.Image', on_delete=models.CASCADE, related_name='rss_media', editable=False)
+    fetched_at = models.DateTimeField(editable=False, verbose_name=_('Last download date'))
+    used_at = models.DateTimeField(editable=False, null=True, blank=True, verbose_name=_('Last use date'))
+
+    class Meta:
+        verbose_name = _('RSS Media')
+        verbose_name_plural = _('RSS Media')
+
+    @staticmethod
+    def hash_url(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def __unicode__(self):
+        return self.url
+
+
+def get_published_cache_key(source_id):
+    return 'rss:published_%s' % source_id
+
+def refresh_published_items(source_id):
+    """
+    Stores in the cache the latest published items of a source, as many as the biggest feed of the source renders
+    """
+    size = RSSFeed.objects.filter(source_id=source_id).aggregate(size=models.Max('amount_to_render'))['size'] or 0
+    size = max(size, PUBLISHED_ITEMS_SIZE)
+    items = list(RSSImport.objects.filter(source_id=source_id, status='complete', enabled=True).order_by('-timestamp').values_list('pk', 'content')[:size])
+    published = {'size': size, 'items': items}
+    cache.set(get_published_cache_key(source_id), published, get_prerender_timeout())
+    return published
+
+def get_prerender_timeout():
+    """
+    Returns the seconds the published items and the fragments rendered by the runs are cached
+    """
+    return getattr(dj_settings, 'RSS_IMPORT_PRERENDER_TIMEOUT', DEFAULT_PRERENDER_TIMEOUT)
+
+def refresh_item_counters(source_id):
+    """
+    Stores the counters of the imports of a source by status, counted with a single grouped query.
+    Expired imports are only kept to recognise their items, so they aren't counted.
+    """
+    counts = dict(RSSImport.objects.filter(source_id=source_id).exclude(status='expired').order_by().values_list('status').annotate(count=models.Count('pk')))
+    RSSSource.objects.filter(pk=source_id).update(
+        total_items=sum(counts.values()),
+        complete_items=counts.get('complete', 0),
+        scheduled_items=counts.get('scheduled', 0),
+        processing_items=counts.get('processing', 0))
+
+def invalidate_published_items(source_id):
+    cache.delete(get_published_cache_key(source_id))
+
+def get_published_items(source_id, amount):
+    """
+    Returns the latest published items of a source without querying the imports when they are cached
+    """
+    published = cache.get(get_published_cache_key(source_id))
+    if published is None or published['size'] < amount:
+        published = refresh_published_items(source_id)
+
+    return [RSSImport(pk=pk, source_id=source_id, content=content, status='complete', enabled=True)
+        for pk, content in published['items'][:amount]]
+
+
+class PreloadedImageId(int):
+    """
+    Filer image pk of an item content carrying the already loaded image
+    """
+
+    def __new__(cls, value, image):
+        obj = super(PreloadedImageId, cls).__new__(cls, value)
+        obj.image = image
+        return obj
+
+
+def render_feeds_cache(source_id):
+    """
+    Renders again the cached fragment of every feed rendering the source, so
+    page requests never render them. Feeds failing to render outside a
+    request are purged instead and rendered by the next request.
+    """
+    for feed in RSSFeed.objects.filter(source_id=source_id).select_related('placeholder', 'source__interval'):
+        try:
+            feed.render_fragment()
+        except Exception as e:
+            warnings.warn('Error pre-rendering the feed %s: %s' % (feed.pk, str(e)))
+            feed.invalidate_cache()
+
+def invalidate_feeds_cache(source_id):
+    """
+    Purges the cached fragment of every feed rendering the source
+    """
+    for feed in RSSFeed.objects.filter(source_id=source_id).select_related('placeholder'):
+        feed.invalidate_cache()
+
+def get_fragment_cache():
+    """
+    Returns the cache the {% cache %} tag stores the fragments in
+    """
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+# Compiled templates by feed pk, with the version they were compiled from
+_feed_templates = {}
+
+def forget_source_templates(source_id):
+    for pk in RSSFeed.objects.filter(source_id=source_id).values_list('pk', flat=True):
+        _feed_templates.pop(pk, None)
+
 class RSSFeed(CMSPlugin):
     source = models.ForeignKey(RSSSource, on_delete=models.CASCADE, related_name=_('rss_feed_source'))
     amount_to_render = models.PositiveSmallIntegerField(verbose_name=_('Amount of items to render'))
     html_template = models.TextField(
         _('Custom HTML Template'), blank=True, help_text=_('If present, the default rendering template will be overriden by this. IMPORTANT: Add all the the LOAD tags at the BEGINNING of the template and the SEKIZAI tags at the END of the template, otherwise the cache could break its rendering'))
+    thumbnail_sizes = models.CharField(
+        _('Thumbnail sizes'), max_length=200, blank=True, default=DEFAULT_THUMBNAIL_SIZE, help_text=_('Comma separated sizes, like 640x480, of the cropped thumbnails generated when the images are imported. The default template renders the first one'))
 
     class Meta:
         verbose_name = _('RSS Feed')
@@ -327,22 +599,86 @@ class RSSFeed(CMSPlugin):
         except:
             raise ValidationError(_('Invalid HTML template format'), code='invalid')
 
-    def save(self, *args, **kwargs):
-        super(RSSFeed, self).save(*args, **kwargs)
-        invalidate_cms_page_cache()
+        if any(not re.match(r'^\d+x\d+$', size) for size in self._split_thumbnail_sizes()):
+            raise ValidationError(_('The thumbnail sizes must be like 640x480 and separated by commas'), code='invalid')
 
-    def delete(self, *args, **kwargs):
-        super(RSSFeed, self).delete(*args, **kwargs)
-        invalidate_cms_page_cache()
+    def _split_thumbnail_sizes(self):
+        return [size.strip() for size in self.thumbnail_sizes.split(',') if size.strip()]
 
-    def get_html_template(self):
-        template = DEFAULT_FEED_PLUGIN_TEMPLATE
-        if self.html_template:
-            if not os.path.exists(self.get_custom_html_path()):
-                self.save_html_custom_template()
-            template = 'feeds/custom/feed_%s.html' % self.pk
+    def get_thumbnail_sizes(self):
+        """
+        Returns the thumbnail sizes of the feed as (width, height) tuples
+        """
+        return [tuple(int(value) for value in size.split('x')) for size in self._split_thumbnail_sizes()]
 
-        return template
+    def get_thumbnail_size(self):
+        sizes = self._split_thumbnail_sizes()
+        return sizes[0] if sizes else DEFAULT_THUMBNAIL_SIZE
+
+    def invalidate_cache(self):
+        """
+        Purges the cached fragment of the feed and the cache of its placeholder.
+        Pages showing the plugin aren't cached by the CMS, so only these hold the feed.
+        """
+        try:
+            get_fragment_cache().delete(make_template_fragment_key(self.get_cache_key()))
+        except Exception as e:
+            warnings.warn('Error purging the fragment of the feed %s: %s' % (self.pk, str(e)))
+        self.purge_placeholder_cache()
+
+    def purge_placeholder_cache(self):
+        """
+        Purges the cached placeholder of the feed. Errors are only reported, as this runs in signal handlers.
+        """
+        try:
+            placeholder = self.placeholder
+            if placeholder is not None and hasattr(placeholder, 'clear_cache'):
+                placeholder.clear_cache(self.language)
+        except Exception as e:
+            warnings.warn('Error purging the placeholder cache of the feed %s: %s' % (self.pk, str(e)))
+
+    def get_html_template(self):
+        """
+        Returns the compiled template of the feed, the custom one or the default
+        one, both caching the feed in the fragment of get_cache_key.
+        Templates are compiled once per process and version of the template.
+        """
+        return self._get_templates()[0]
+
+    def get_fragment_template(self):
+        """
+        Returns the compiled template of the cached fragment of the feed alone
+        """
+        return self._get_templates()[1]
+
+    def _get_templates(self):
+        # Only local fields, rendering a compiled feed doesn't query its source. The
+        # compiled templates of a source are forgotten when it is saved, as they embed its period.
+        version = '%s:%s' % (self.source_id, hashlib.sha1(self.html_template.encode('utf-8')).hexdigest())
+        compiled = _feed_templates.get(self.pk)
+        if compiled is None or compiled[0] != version:
+            # The first DjangoTemplates backend, whatever its name
+            engine = Engine.get_default()
+            if self.html_template:
+                load_block, html_block, sekizai_block = self._split_html_custom_template()
+                fragment = engine.from_string('%s\n%s' % (load_block, html_block))
+            else:
+                fragment = engine.get_template(DEFAULT_FEED_PLUGIN_TEMPLATE)
+            compiled = (version, engine.from_string(self.build_html_custom_template()), fragment)
+            _feed_templates[self.pk] = compiled
+        return compiled[1], compiled[2]
+
+    def forget_html_template(self):
+        _feed_templates.pop(self.pk, None)
+
+    def render_fragment(self):
+        """
+        Renders the cached fragment of the feed and stores it where the {% cache %} tag of its template reads it.
+        There is no request, so it is rendered in the language of the feed and without context processors.
+        """
+        with translation.override(self.language):
+            html = self.get_fragment_template().render(Context({'instance': self, 'placeholder': self.placeholder}))
+        get_fragment_cache().set(make_template_fragment_key(self.get_cache_key()), html, get_prerender_timeout())
 
     def _search_tag_end_html(self, tag, last=False, end=False):
         tag_find = '{% ' + tag
@@ -367,32 +703,57 @@ class RSSFeed(CMSPlugin):
     def get_cache_key(self):
         return "rss:feed_%s" % self.pk
 
-    def get_custom_html_path(self):
-        return os.path.join(dj_settings.DATA_DIR, CUSTOM_TEMPLATE_DIR, 'feed_%s.html' % self.pk)
+    def get_cache_timeout(self):
+        return self.source.get_period_in_seconds() / 2
 
-    def save_html_custom_template(self):
-        if self.html_template:
-            last_load = self._search_tag_end_html('load', last=True, end=True)
-            first_addtoblock = self._search_tag_end_html('addtoblock')
+    def _split_html_custom_template(self):
+        """
+        Returns the load tags, the html and the sekizai tags of the custom template
+        """
+        last_load = self._search_tag_end_html('load', last=True, end=True)
+        first_addtoblock = self._search_tag_end_html('addtoblock')
 
-            load_block = ''
-            html_block = ''
-            sekizai_block = ''
+        load_block = ''
+        html_block = ''
+        sekizai_block = ''
 
-            if last_load != -1:
-                load_block = self.html_template[:last_load]
+        if last_load != -1:
+            load_block = self.html_template[:last_load]
 
-            if first_addtoblock != -1:
-                sekizai_block = self.html_template[first_addtoblock:]
-                html_block = self.html_template[last_load + 1:first_addtoblock - 1]
-            else:
-                html_block = self.html_template[last_load + 1:]
+        if first_addtoblock != -1:
+            sekizai_block = self.html_template[first_addtoblock:]
+            html_block = self.html_template[last_load + 1:first_addtoblock - 1]
+        else:
+            html_block = self.html_template[last_load + 1:]
+
+        return load_block, html_block, sekizai_block
+
+    def build_html_custom_template(self):
+        if self.html_template:
+            load_block, html_block, sekizai_block = self._split_html_custom_template()
+        else:
+            load_block, html_block, sekizai_block = '', '{%% include "%s" %%}' % DEFAULT_FEED_PLUGIN_TEMPLATE, ''
 
-            html_to_save = """{%% load cache %%}\n%(load_block)s\n{%% cache %(time)s %(template)s %%}\n%(html_block)s\n{%% endcache %%}\n%(sekizai_block)s
-            """ % {'time': self.source.get_period_in_seconds() / 2, 'template': self.get_cache_key(), 'load_block': load_block, 'html_block': html_block, 'sekizai_block': sekizai_block}
-            f = open(self.get_custom_html_path(), 'w+')
-            f.write(html_to_save)
-            f.close()
+        return """{%% load cache %%}\n%(load_block)s\n{%% cache %(time)s %(template)s %%}\n%(html_block)s\n{%% endcache %%}\n%(sekizai_block)s
+        """ % {'time': self.get_cache_timeout(), 'template': self.get_cache_key(), 'load_block': load_block, 'html_block': html_block, 'sekizai_block': sekizai_block}
 
     def get_feed(self):
-        return RSSImport.objects.only('content').filter(source_id=self.source.pk, status='complete', enabled=True).order_by('-timestamp')[:self.amount_to_render]
+        if not hasattr(self, '_feed'):
+            items = get_published_items(self.source_id, self.amount_to_render)
+
+            # The images of all the items are loaded in a single query
+            image_ids = set()
+            for item in items:
+                image_ids.update(value for value in item.content.get('multimedia', {}).values() if value is not None)
+
+            if image_ids:
+                from filer.models.imagemodels import Image
+                images = Image.objects.in_bulk(image_ids)
+                for item in items:
+                    multimedia = item.content.get('multimedia', {})
+                    for key, value in multimedia.items():
+                        if value in images:
+                            multimedia[key] = PreloadedImageId(value, images[value])
+
+            self._feed = items
+        return self._feed
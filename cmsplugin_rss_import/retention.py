@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from .collector import delete_orphaned_images, get_grace_date
+from .constants import RETENTION_BATCH_SIZE
+from .models import RSSSource, RSSImport, get_published_cache_key, refresh_published_items, refresh_item_counters, render_feeds_cache
+import warnings
+
+def get_expired_filter(source):
+    """
+    Returns the filter of the imports of a source beyond its retention limits, or None if it keeps them all
+    """
+    expired = Q()
+    if source.keep_days:
+        expired |= Q(timestamp__lt=timezone.now() - timedelta(days=source.keep_days))
+
+    if source.keep_items:
+        # Everything older than the last item kept
+        boundary = RSSImport.objects.filter(source=source).exclude(status='expired').order_by('-timestamp', '-pk').values_list('timestamp', 'pk')[source.keep_items - 1:source.keep_items]
+        if boundary:
+            timestamp, pk = boundary[0]
+            expired |= Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk)
+
+    return expired if expired.children else None
+
+def prune_source(source, dry_run=False, batch_size=RETENTION_BATCH_SIZE):
+    """
+    Expires the imports of a source beyond its retention limits in batches,
+    returning the amount of imports expired and images deleted (or to expire and
+    delete on a dry run). Expired imports keep only their fingerprint, so items
+    still listed by the feed aren't imported again, and the images only they
+    referenced are deleted once per batch, unless a run reused them within the
+    grace period of the media collector. Imports being processed are left to a later sweep.
+    """
+    Through = RSSImport.images.through
+
+    deleted_items = 0
+    deleted_images = 0
+    expired = get_expired_filter(source)
+    if expired is None:
+        return deleted_items, deleted_images
+
+    expired_imports = RSSImport.objects.filter(expired, source=source).exclude(status__in=['expired', 'processing'])
+    published = cache.get(get_published_cache_key(source.pk))
+    published_pks = set(pk for pk, content in published['items']) if published else None
+    affects_feeds = published_pks is None
+
+    counted_images = set()
+    last_pk = 0
+    while True:
+        batch = list(expired_imports.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1]
+
+        image_ids = set(Through.objects.filter(rssimport_id__in=batch).values_list('image_id', flat=True))
+        if dry_run:
+            # Images also referenced by imports that are kept would survive
+            image_ids -= counted_images
+            kept = Through.objects.filter(image_id__in=image_ids).exclude(rssimport_id__in=expired_imports.values('pk'))
+            deleted_images += len(image_ids - set(kept.values_list('image_id', flat=True)))
+            counted_images |= image_ids
+        else:
+            Through.objects.filter(rssimport_id__in=batch).delete()
+            RSSImport.objects.filter(pk__in=batch).update(status='expired', enabled=False, content={}, timestamp=timezone.now())
+            if image_ids:
+                # Images kept now are left to the media collector
+                deleted_images += delete_orphaned_images(image_ids, get_grace_date())
+
+        deleted_items += len(batch)
+        if published_pks and published_pks.intersection(batch):
+            affects_feeds = True
+
+    if deleted_items and not dry_run:
+        refresh_published_items(source.pk)
+        refresh_item_counters(source.pk)
+        if affects_feeds:
+            render_feeds_cache(source.pk)
+
+    return deleted_items, deleted_images
+
+def purge_expired(source, dry_run=False, batch_size=RETENTION_BATCH_SIZE):
+    """
+    Deletes in batches the expired imports of a source that its last full scan
+    didn't see, as their items left the feed, returning how many were deleted
+    (or would be on a dry run). Runs refresh the timestamp of the expired
+    imports they see, so those newer than the full scan are still listed.
+    """
+    if not source.full_scan_date:
+        return 0
+
+    gone = RSSImport.objects.filter(source=source, status='expired', timestamp__lt=source.full_scan_date)
+    if dry_run:
+        return gone.count()
+
+    purged = 0
+    while True:
+        batch = list(gone.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        RSSImport.objects.filter(pk__in=batch, status='expired').delete()
+        purged += len(batch)
+    return purged
+
+def sweep_retention():
+    """
+    Prunes every source with retention limits, run periodically by the scheduler
+    """
+    try:
+        for source in RSSSource.objects.filter(Q(keep_items__isnull=False) | Q(keep_days__isnull=False)):
+            try:
+                deleted_items, deleted_images = prune_source(source)
+                if deleted_items:
+                    warnings.warn('Expired %s items and deleted %s images of RSS Source %s' % (deleted_items, deleted_images, source.url))
+                purged = purge_expired(source)
+                if purged:
+                    warnings.warn('Deleted %s expired items gone from RSS Source %s' % (purged, source.url))
+            except Exception as e:
+                warnings.warn('Error pruning RSS Source %s: %s' % (source.url, str(e)))
+    finally:
+        connection.close()
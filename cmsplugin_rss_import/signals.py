@@ -1,44 +1,66 @@
 # -*- coding: utf-8 -*-
+from django.db import transaction
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
-from .models import RSSSource, RSSImport, RSSFeed
-import os
+from .extractors import invalidate_extractor
+from .models import RSSSource, RSSImport, RSSFeed, invalidate_published_items, invalidate_feeds_cache, refresh_item_counters, forget_source_templates
+import itertools, threading
+
+_tickets = itertools.count(1)
+_refreshed = threading.local()
+
+def refresh_source_on_commit(source_id):
+    """
+    Refreshes the published items, the counters and the feed fragments of a
+    source once the transaction commits. Every deletion of a bulk or cascade
+    delete queues a callback, only the first one run after the commit refreshes.
+    """
+    ticket = next(_tickets)
+    def refresh():
+        refreshed = _refreshed.__dict__.setdefault('sources', {})
+        if refreshed.get(source_id, 0) > ticket:
+            return
+        refreshed[source_id] = next(_tickets)
+        invalidate_published_items(source_id)
+        refresh_item_counters(source_id)
+        invalidate_feeds_cache(source_id)
+    transaction.on_commit(refresh)
 
 @receiver(post_save, sender=RSSFeed)
 def post_save_rss_feed(sender, instance, created, **kwargs):
-    cache.delete(make_template_fragment_key(instance.get_cache_key()))
-    file_path = instance.get_custom_html_path()
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-    if instance.html_template:
-        instance.save_html_custom_template()
+    instance.invalidate_cache()
+    # The amount of items to render may have grown
+    invalidate_published_items(instance.source_id)
 
 @receiver(post_delete, sender=RSSFeed)
 def post_delete_rss_feed(sender, instance, **kwargs):
-    cache.delete(make_template_fragment_key(instance.get_cache_key()))
-    file_path = instance.get_custom_html_path()
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    instance.invalidate_cache()
+    instance.forget_html_template()
+
+@receiver(post_save, sender=RSSSource)
+def post_save_rss_source(sender, instance, created, **kwargs):
+    invalidate_extractor(instance.pk)
+    # The cache timeout of the feed templates depends on the schedule of the source
+    forget_source_templates(instance.pk)
 
 @receiver(post_delete, sender=RSSSource)
 def post_delete_rss_source(sender, instance, **kwargs):
+    invalidate_extractor(instance.pk)
     try:
         from .apps import scheduler
-        scheduler.remove_job(instance.url + ':' + instance.task)
+        scheduler.remove_job(instance.get_job_id())
     except:
         # Job doesn't exist, so ignore the exception
         pass
 
+@receiver(post_save, sender=RSSImport)
+def post_save_rss_import(sender, instance, created, **kwargs):
+    invalidate_published_items(instance.source_id)
+
 @receiver(post_delete, sender=RSSImport)
 def post_delete_rss_import(sender, instance, **kwargs):
-    content = instance.content
-    if "multimedia" in content:
-        for key, value in content["multimedia"].iteritems():
-            try:
-                from filer.models.imagemodels import Image
-                Image.objects.filter(pk=value).delete()
-            except:
-                pass
+    if instance.status == 'expired':
+        # Expired imports are neither published nor counted
+        return
+    # Images left without imports are deleted by the media collector, off the request path
+    refresh_source_on_commit(instance.source_id)
@@ -1,163 +1,472 @@
 # -*- coding: utf-8 -*-
-from django.db import connection
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
-from .models import RSSSource, RSSImport
+from collections import OrderedDict, deque
+from datetime import timedelta
+from tempfile import SpooledTemporaryFile
+from .models import RSSSource, RSSImport, RSSMedia, RSSFeed, refresh_published_items, refresh_item_counters, render_feeds_cache
+from .constants import FEED_CHUNK_SIZE, FEED_SPOOL_MAX_SIZE, DEFAULT_MAX_WORKERS, DEFAULT_QUEUE_SIZE, DEFAULT_FETCH_MAX_BYTES, \
+    IMAGE_BATCH_SIZE, DEFAULT_IMAGE_WORKERS, DEFAULT_IMAGE_MAX_BYTES, DEFAULT_IMAGE_TIMEOUT, DEFAULT_IMAGE_CACHE_TTL, \
+    THUMBNAIL_OPTIONS, DEFAULT_THUMBNAIL_WORKERS, DEFAULT_FULL_SCAN_INTERVAL, DEFAULT_PROCESSING_TIMEOUT
 from .decorators import task
-import warnings, urllib2, re, threading
+from .extractors import get_extractor
+from .fetchers import FetchError, get_fetcher
+from .metrics import RunMetrics, export_run
+from .workers import WorkerPool
+import hashlib, warnings, threading, time
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+def get_image_pool():
+    """
+    Returns the thread pool shared by all the runs to download images
+    """
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            from multiprocessing.pool import ThreadPool
+            _image_pool = ThreadPool(getattr(settings, 'RSS_IMPORT_IMAGE_WORKERS', DEFAULT_IMAGE_WORKERS))
+        return _image_pool
+
+_thumbnail_pool = None
+_thumbnail_pool_lock = threading.Lock()
+
+def get_thumbnail_pool():
+    """
+    Returns the thread pool shared by all the runs to generate thumbnails
+    """
+    global _thumbnail_pool
+    with _thumbnail_pool_lock:
+        if _thumbnail_pool is None:
+            from multiprocessing.pool import ThreadPool
+            _thumbnail_pool = ThreadPool(getattr(settings, 'RSS_IMPORT_THUMBNAIL_WORKERS', DEFAULT_THUMBNAIL_WORKERS))
+        return _thumbnail_pool
+
+def generate_thumbnails(image, sizes):
+    """
+    Generates the thumbnails of a filer image with the options the feed templates render them
+    """
+    try:
+        thumbnailer = image.easy_thumbnails_thumbnailer
+        for size in sizes:
+            thumbnailer.get_thumbnail(dict(THUMBNAIL_OPTIONS, size=size))
+    except Exception as e:
+        warnings.warn('Error generating the thumbnails of the image %s: %s' % (image.pk, str(e)))
+    finally:
+        # Runs in a pool thread
+        connection.close()
+
+processing_pool = WorkerPool('rss-processing',
+    getattr(settings, 'RSS_IMPORT_MAX_WORKERS', DEFAULT_MAX_WORKERS),
+    getattr(settings, 'RSS_IMPORT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
 
 @task
 def process_rss(source_id, execute=False):
     if execute:
-        warnings.warn('Starting RSS processing thread')
-        RssProcessingThread(source_id).start()
+        warnings.warn('Queueing RSS processing of source %s' % source_id)
+        processing_pool.submit(str(source_id), RssSourceProcessor(source_id).run)
     else:
         warnings.warn('The task is not configured for execution')
 
-class RssProcessingThread(threading.Thread):
+class RssSourceProcessor(object):
+    """
+    Processes a source once, run synchronously by a worker of the processing pool
+    """
+
     def __init__(self, source_id):
         self.source_id = source_id
-        threading.Thread.__init__(self)
 
     def run(self):
+        metrics = RunMetrics(self.source_id)
+        source = None
         try:
             source = RSSSource.objects.get(pk=self.source_id)
-            source.last_process_date = timezone.now()
-            source.save()
+            # Plain update, saving the source would reschedule its job
+            RSSSource.objects.filter(pk=source.pk).update(last_process_date=timezone.now())
             warnings.warn('Processing RSS Source: %s' % source.url)
+            items_counter = 0
+            total_items = 0
             try:
-                request = urllib2.Request(source.url)
-                rss_file = urllib2.urlopen(request)
-
-                from lxml import etree as ET
-                tree = ET.parse(rss_file)
-                rss_file.close()
-
-                rss = tree.getroot()
-                process_settings = source.settings
-                items = rss.findall(process_settings['wrapper'])
-                total_items = len(items)
-
-                if source.reverse:
-                    items = reversed(items)
-
-                items_counter = 0
-                for item in items:
-                    item_to_save = {}
-                    image_process = False
-                    image_fields = []
-                    for field in process_settings['fields']:
-                        field_content = item.find(field['source'], rss.nsmap)
-                        if 'empty' in field:
-                            if isinstance(field['attributes'], basestring):
-                                content = field_content.attrib[field['attributes']]
-                            else:
-                                content = {}
-                                for attribute in field['attributes']:
-                                    attr = attribute['target'] if 'target' in attribute else attribute['source']
-                                    content[attr] = field_content.attrib[attribute['source']]
-
-                        if 'type' in field:
-                            if field["type"] == "image":
-                                image_process = True
-
-                                if "empty" in field:
-                                    image_url = content[field["location"]]
-                                else:
-                                    content = field_content.text
-                                    image_url = content
-
-                                name = field['target'] if 'target' in field else field['source']
-                                image_fields.append({'name': name, 'url': image_url})
-
-                            elif field["type"] == "date":
-                                from dateutil.parser import parse as time_parse
-                                content = time_parse(field_content.text).strftime(field['save_format']) if 'save_format' in field else field_content.text
-                            else:
-                                content = field_content.text
-                        elif "empty" not in field:
-                            content = field_content.text
-
-                        name = field['target'] if 'target' in field else field['source']
-                        item_to_save[name] = content
-
-                    content_regex = r''
-                    for unique_field in process_settings["unique"]:
-                        field_regex = '"%s":"%s"' % (unique_field, item_to_save[unique_field])
-                        content_regex += r"(?=.*" + re.escape(field_regex) + r")"
-                        warnings.warn('Content regex to filter by: %s' % content_regex)
-                    qs = RSSImport.objects.filter(source=source, content__regex=content_regex)
-
-                    if len(qs) == 0:
-                        imported_item = RSSImport.objects.create(source=source, content=item_to_save)
-                    else:
-                        imported_item = qs[0]
-
-                        qs = qs.exclude(id=imported_item.pk)
-                        for old_import in qs:
-                            old_import.delete()
-
-                    if imported_item.status == 'scheduled':
-                        if image_process:
-                            imported_item.status = 'processing'
-                            imported_item.save()
-                            for image_field in image_fields:
-                                self._save_image(imported_item, image_field['name'], image_field['url'], len(image_fields))
-                        else:
-                            imported_item.status = 'complete'
-                            imported_item.enabled = True
-                            imported_item.save()
-                            source.last_import_date = timezone.now()
-                            source.save()
-                    items_counter += 1
+                full_scan = self._needs_full_scan(source)
+                scan_started = timezone.now()
+                retry = full_scan and self._requeue_stale_items(source)
+                with metrics.phase('fetch'):
+                    # Items to retry are in the feed processed last time, which a conditional request would skip
+                    response = self._fetch(source, conditional=not retry)
+                if response is None:
+                    warnings.warn('RSS Source %s has not changed since the last run' % source.url)
+                    metrics.status = 'unchanged'
+                    source.adapt_interval(0, True)
+                    return
+                rss_file, validators = response
+
+                parsed_items, watermark = self._parse(source, rss_file, full_scan, metrics)
+                total_items = len(parsed_items)
+
+                items_counter, imported = self._ingest(source, parsed_items, metrics)
+                if metrics.counters['failed']:
+                    # Items were skipped, so neither the validators nor the watermark are stored
+                    # and the next run fetches the whole feed again to retry them
+                    RSSSource.objects.filter(pk=source.pk).update(full_scan_date=None)
+                else:
+                    # Stored only after a successful run, so a failed one is retried
+                    validators['watermark'] = watermark
+                    if full_scan:
+                        # The start of the scan, so the expired items it saw are newer than it
+                        validators['full_scan_date'] = scan_started
+                    RSSSource.objects.filter(pk=source.pk).update(**validators)
+                source.adapt_interval(imported, False)
             except Exception as e:
                 warnings.warn('Error processing the request: %s' % str(e))
+                metrics.fail(e)
 
             warnings.warn('Processed %s of %s items' % (str(items_counter), str(total_items)))
         finally:
+            if source is not None:
+                metrics.finish()
+                export_run(metrics)
             connection.close()
             warnings.warn('Finished RSS processing')
 
-    def _save_image(self, rss_import, field_id, image_url, item_complete):
-        warnings.warn('Starting multimedia processing of the entry width id %s' % rss_import.id)
+    def _parse(self, source, rss_file, full_scan, metrics):
+        """
+        Extracts the items of the feed to process, in processing order, and
+        returns them with the watermark to store. Only feeds whose "order" is
+        set stop at the watermark, the others are read whole and deduplicated
+        by their fingerprints.
+        """
+        process_settings = source.settings
+        max_items = process_settings.get('max_items')
+        order = process_settings.get('order')
+        # The newest max_items are the last ones of oldest first feeds, otherwise the first ones
+        parsed_items = deque(maxlen=max_items if order == 'oldest_first' else None)
+        watermark = ''
+        extractor = get_extractor(source)
+        try:
+            for item in metrics.timed('parse', extractor.iter_items(rss_file, process_settings.get('stream', False))):
+                metrics.count('seen')
+                try:
+                    with metrics.phase('extract'):
+                        item_to_save, image_fields = extractor.extract(item)
+                        fingerprint = source.get_fingerprint(item_to_save)
+                except Exception as e:
+                    warnings.warn('Error extracting an item of %s: %s' % (source.url, str(e)))
+                    metrics.count('failed')
+                    continue
+
+                if order == 'oldest_first':
+                    watermark = fingerprint
+                    if not full_scan and fingerprint == source.watermark:
+                        # Only the items after the newest one of a previous run are new
+                        metrics.count('duplicated', len(parsed_items) + 1)
+                        parsed_items.clear()
+                        continue
+                    parsed_items.append((fingerprint, item_to_save, bool(image_fields), image_fields))
+                else:
+                    if order == 'newest_first':
+                        if not full_scan and fingerprint == source.watermark:
+                            # The rest of the feed was processed by a previous run
+                            break
+                        if not parsed_items:
+                            watermark = fingerprint
+                    parsed_items.append((fingerprint, item_to_save, bool(image_fields), image_fields))
+                    if max_items and len(parsed_items) >= max_items:
+                        break
+        finally:
+            rss_file.close()
+
+        parsed_items = list(parsed_items)
+        if source.reverse:
+            parsed_items.reverse()
+        return parsed_items, watermark
+
+    def _needs_full_scan(self, source):
+        """
+        Returns whether the whole feed must be processed instead of stopping at
+        the watermark: without a watermark or periodically, so the items a
+        previous run couldn't complete are processed again
+        """
+        interval = getattr(settings, 'RSS_IMPORT_FULL_SCAN_INTERVAL', DEFAULT_FULL_SCAN_INTERVAL)
+        return not source.watermark or not source.full_scan_date or \
+            source.full_scan_date < timezone.now() - timedelta(seconds=interval)
+
+    def _requeue_stale_items(self, source):
+        """
+        Schedules again the items left in processing for longer than
+        RSS_IMPORT_PROCESSING_TIMEOUT by a run that died, returning whether the
+        source has scheduled items to retry
+        """
+        timeout = getattr(settings, 'RSS_IMPORT_PROCESSING_TIMEOUT', DEFAULT_PROCESSING_TIMEOUT)
+        requeued = RSSImport.objects.filter(source=source, status='processing',
+            timestamp__lt=timezone.now() - timedelta(seconds=timeout)).update(status='scheduled')
+        if requeued:
+            warnings.warn('Scheduled again %s stale items of RSS Source %s' % (requeued, source.url))
+            refresh_item_counters(source.pk)
+            return True
+        return RSSImport.objects.filter(source=source, status='scheduled').exists()
+
+    def _fetch(self, source, conditional=True):
+        """
+        Downloads the feed of the source, returning None when it didn't change
+        since the last run, unless the request isn't conditional
+        """
+        max_bytes = getattr(settings, 'RSS_IMPORT_FETCH_MAX_BYTES', DEFAULT_FETCH_MAX_BYTES)
+        headers = {}
+        if conditional and source.etag:
+            headers['If-None-Match'] = source.etag
+        if conditional and source.last_modified:
+            headers['If-Modified-Since'] = source.last_modified
+
+        rss_file = get_fetcher().open(source.url, headers)
+        if rss_file.status == 304:
+            rss_file.close()
+            return None
+
+        # The body is spooled to disk past FEED_SPOOL_MAX_SIZE so large feeds aren't held in memory
+        body = SpooledTemporaryFile(max_size=FEED_SPOOL_MAX_SIZE)
+        digest = hashlib.sha1()
+        size = 0
         try:
-            source = rss_import.source
-            warnings.warn("Processing Multimedia for %s (%s)" % (source.name, source.url))
-            item_to_save = rss_import.content
+            for chunk in iter(lambda: rss_file.read(FEED_CHUNK_SIZE), ''):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise FetchError('The feed of %s is bigger than %s bytes' % (source.url, max_bytes))
+                digest.update(chunk)
+                body.write(chunk)
+            validators = {
+                'etag': rss_file.getheader('ETag', ''),
+                'last_modified': rss_file.getheader('Last-Modified', ''),
+                'content_digest': digest.hexdigest(),
+            }
+        except:
+            body.close()
+            raise
+        finally:
+            rss_file.close()
+
+        if conditional and source.content_digest and source.content_digest == validators['content_digest']:
+            # Same body with new validators, keep them so the next request can get a 304
+            body.close()
+            RSSSource.objects.filter(pk=source.pk).update(**validators)
+            return None
+
+        body.seek(0)
+        return body, validators
+
+    def _ingest(self, source, parsed_items, metrics):
+        """
+        Writes the parsed items of a run with a fixed number of queries,
+        returning the amount of items processed and published
+        """
+        with metrics.phase('dedup'):
+            # Keep the first occurrence of items repeated in the same feed
+            pending = OrderedDict()
+            for fingerprint, item_to_save, image_process, image_fields in parsed_items:
+                pending.setdefault(fingerprint, (item_to_save, image_process, image_fields))
+
+            existing = dict(RSSImport.objects.filter(source=source, fingerprint__in=pending.keys()).values_list('fingerprint', 'status'))
+
+            new_imports = []
+            complete_fingerprints = []
+            image_fingerprints = []
+            for fingerprint, (item_to_save, image_process, image_fields) in pending.iteritems():
+                if fingerprint in existing and existing[fingerprint] != 'scheduled':
+                    continue
 
-            if "multimedia" not in item_to_save:
-                item_to_save["multimedia"] = {}
+                if image_process:
+                    image_fingerprints.append(fingerprint)
+                else:
+                    complete_fingerprints.append(fingerprint)
 
-            if field_id not in item_to_save["multimedia"]:
-                from filer.models.foldermodels import Folder
-                parent, parent_created = Folder.objects.get_or_create(name='RSS Files')
-                rss_folder, rss_created = Folder.objects.get_or_create(name=source.name, parent=parent)
+                if fingerprint not in existing:
+                    new_imports.append(RSSImport(source=source, content=item_to_save, fingerprint=fingerprint,
+                        status='processing' if image_process else 'complete', enabled=not image_process))
 
-                from django.core.files.temp import NamedTemporaryFile
-                with NamedTemporaryFile(delete=True) as file_tmp_obj:
-                    img_file = urllib2.urlopen(image_url)
-                    file_tmp_obj.write(img_file.read())
-                    file_tmp_obj.flush()
-                    file_name = image_url.rsplit('/', 1)[-1]
+        metrics.count('new', len(new_imports))
+        metrics.count('duplicated', len(parsed_items) - len(complete_fingerprints) - len(image_fingerprints))
 
-                    from django.core.files import File as DjangoFile
-                    file_obj = DjangoFile(file_tmp_obj, name=file_name)
+        with metrics.phase('write'):
+            RSSImport.objects.bulk_create(new_imports)
+            RSSImport.objects.filter(source=source, fingerprint__in=complete_fingerprints, status='scheduled').update(status='complete', enabled=True)
+            RSSImport.objects.filter(source=source, fingerprint__in=image_fingerprints, status='scheduled').update(status='processing')
+            expired = [fingerprint for fingerprint, status in existing.iteritems() if status == 'expired']
+            if expired:
+                # The timestamp of expired imports is when they were last seen, the retention sweep deletes those gone from the feed
+                RSSImport.objects.filter(source=source, fingerprint__in=expired, status='expired').update(timestamp=timezone.now())
 
-                    from filer.models.imagemodels import Image
-                    image = Image.objects.create(original_filename=file_name, file=file_obj, folder=rss_folder)
+        imported = len(complete_fingerprints)
+        try:
+            if image_fingerprints:
+                with metrics.phase('images'):
+                    image_items = RSSImport.objects.filter(source=source, fingerprint__in=image_fingerprints, status='processing')
+                    try:
+                        imported += self._process_images(source, image_items, pending)
+                    except:
+                        # The items not completed yet go back to scheduled, so the next run processes them again
+                        RSSImport.objects.filter(source=source, fingerprint__in=image_fingerprints, status='processing').update(status='scheduled')
+                        raise
+        finally:
+            if new_imports or complete_fingerprints or image_fingerprints:
+                refresh_item_counters(source.pk)
+
+        if imported:
+            with metrics.phase('write'):
+                RSSSource.objects.filter(pk=source.pk).update(last_import_date=timezone.now())
+                refresh_published_items(source.pk)
+                render_feeds_cache(source.pk)
+
+        return len(pending), imported
+
+    def _process_images(self, source, image_items, pending):
+        """
+        Downloads the images of the items in a bounded pool and stores them in
+        filer, returning the amount of items completed. Images are reused when
+        their url was downloaded recently or their content is already stored.
+        """
+        folder = self._get_image_folder(source)
+        ttl = getattr(settings, 'RSS_IMPORT_IMAGE_CACHE_TTL', DEFAULT_IMAGE_CACHE_TTL)
+        thumbnail_sizes = set()
+        for feed in RSSFeed.objects.filter(source=source).only('thumbnail_sizes'):
+            thumbnail_sizes.update(feed.get_thumbnail_sizes())
+        completed = 0
+        image_items = list(image_items)
+        for start in range(0, len(image_items), IMAGE_BATCH_SIZE):
+            batch = image_items[start:start + IMAGE_BATCH_SIZE]
+            downloads = []
+            for imported_item in batch:
+                multimedia = imported_item.content.setdefault('multimedia', {})
+                for image_field in pending[imported_item.fingerprint][2]:
+                    if image_field['name'] not in multimedia:
+                        downloads.append((imported_item, image_field))
+
+            urls = set(image_field['url'] for imported_item, image_field in downloads)
+            media = dict((media.url_hash, media) for media in RSSMedia.objects.filter(url_hash__in=[RSSMedia.hash_url(url) for url in urls]))
+            image_ids = {}
+            fresh_since = timezone.now() - timedelta(seconds=ttl)
+            for url in urls:
+                cached = media.get(RSSMedia.hash_url(url))
+                if cached and cached.fetched_at >= fresh_since:
+                    image_ids[url] = cached.image_id
+            alive = self._touch_media(set(image_ids.values()))
+            image_ids = dict((url, image_id) for url, image_id in image_ids.iteritems() if image_id in alive)
+
+            to_download = [url for url in urls if url not in image_ids]
+            image_files = dict(zip(to_download, get_image_pool().map(self._download_image, to_download)))
+            try:
+                digests = set(image_file[1] for image_file in image_files.values() if image_file is not None)
+                stored = dict(RSSMedia.objects.filter(sha1__in=digests).values_list('sha1', 'image_id'))
+                alive = self._touch_media(set(stored.values()))
+                stored = dict((sha1, image_id) for sha1, image_id in stored.iteritems() if image_id in alive)
+                created_images = []
+                for url, image_file in image_files.iteritems():
+                    if image_file is None:
+                        image_ids[url] = None
+                        continue
+
+                    file_tmp_obj, sha1 = image_file
+                    if sha1 not in stored:
+                        image = self._save_image(folder, url, file_tmp_obj)
+                        stored[sha1] = image.pk if image else None
+                        if image:
+                            created_images.append(image)
+
+                    image_ids[url] = stored[sha1]
+                    if stored[sha1] is not None:
+                        RSSMedia.objects.update_or_create(url_hash=RSSMedia.hash_url(url),
+                            defaults={'url': url, 'sha1': sha1, 'image_id': stored[sha1], 'fetched_at': timezone.now(), 'used_at': timezone.now()})
+            finally:
+                for image_file in image_files.values():
+                    if image_file is not None:
+                        image_file[0].close()
+
+            if thumbnail_sizes and created_images:
+                # Before the items are published, so rendering them only reads the thumbnails
+                get_thumbnail_pool().map(lambda image: generate_thumbnails(image, thumbnail_sizes), created_images)
+
+            references = []
+            for imported_item, image_field in downloads:
+                imported_item.content['multimedia'][image_field['name']] = image_ids[image_field['url']]
+
+            for imported_item in batch:
+                for image_id in set(imported_item.content['multimedia'].values()):
+                    if image_id is not None:
+                        references.append(RSSImport.images.through(rssimport_id=imported_item.pk, image_id=image_id))
+
+            # The references are stored with the items, so no item is published without them
+            with transaction.atomic():
+                RSSImport.images.through.objects.bulk_create(references)
+                for imported_item in batch:
+                    imported_item.status = 'complete'
+                    imported_item.enabled = True
+                    imported_item.save()
+                    completed += 1
+
+        return completed
+
+    def _touch_media(self, image_ids):
+        """
+        Marks the media of the images about to be reused as used, so the media
+        collector keeps them, returning the pks of those it hasn't deleted meanwhile
+        """
+        if not image_ids:
+            return set()
+        # Waits for a collection locking these media, after which the deleted ones are gone
+        RSSMedia.objects.filter(image_id__in=image_ids).update(used_at=timezone.now())
+        return set(RSSMedia.objects.filter(image_id__in=image_ids).values_list('image_id', flat=True))
+
+    def _get_image_folder(self, source):
+        from filer.models.foldermodels import Folder
+        parent, parent_created = Folder.objects.get_or_create(name='RSS Files')
+        rss_folder, rss_created = Folder.objects.get_or_create(name=source.name, parent=parent)
+        return rss_folder
+
+    def _download_image(self, image_url):
+        """
+        Streams an image to a temporary file, returning it with its SHA-1 or
+        None if it fails or exceeds the limits
+        """
+        from django.core.files.temp import NamedTemporaryFile
+        max_bytes = getattr(settings, 'RSS_IMPORT_IMAGE_MAX_BYTES', DEFAULT_IMAGE_MAX_BYTES)
+        timeout = getattr(settings, 'RSS_IMPORT_IMAGE_TIMEOUT', DEFAULT_IMAGE_TIMEOUT)
+        file_tmp_obj = NamedTemporaryFile(delete=True)
+        digest = hashlib.sha1()
+        try:
+            started = time.time()
+            img_file = get_fetcher().open(image_url)
+            try:
+                size = 0
+                for chunk in iter(lambda: img_file.read(FEED_CHUNK_SIZE), ''):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise FetchError('The image is bigger than %s bytes' % max_bytes)
+                    if time.time() - started > timeout:
+                        raise FetchError('The image took more than %s seconds to download' % timeout)
+                    digest.update(chunk)
+                    file_tmp_obj.write(chunk)
+            finally:
+                img_file.close()
+            file_tmp_obj.flush()
+            file_tmp_obj.seek(0)
+            return file_tmp_obj, digest.hexdigest()
+        except Exception as e:
+            warnings.warn('Error downloading the image %s: %s' % (image_url, str(e)))
+            file_tmp_obj.close()
+            return None
+
+    def _save_image(self, folder, image_url, image_file):
+        if image_file is None:
+            return None
+
+        try:
+            file_name = image_url.rsplit('/', 1)[-1]
 
-                    file_obj.close()
-                    img_file.close()
+            from django.core.files import File as DjangoFile
+            file_obj = DjangoFile(image_file, name=file_name)
 
-                    item_to_save["multimedia"][field_id] = image.pk
-                    rss_import.content = item_to_save
-        except Exception, e:
+            from filer.models.imagemodels import Image
+            return Image.objects.create(original_filename=file_name, file=file_obj, folder=folder)
+        except Exception as e:
             warnings.warn('Error processing the image: %s' % str(e))
-            item_to_save["multimedia"][field_id] = None
-
-        if len(item_to_save["multimedia"]) == item_complete:
-            rss_import.status = 'complete'
-            rss_import.enabled = True
-            rss_import.save()
-            source.last_import_date = timezone.now()
-            source.save()
-        warnings.warn('Image processing finished')
+            return None
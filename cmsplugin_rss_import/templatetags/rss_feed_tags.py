@@ -6,4 +6,8 @@ register = template.Library()
 
 @register.filter
 def get_filer_image(id):
+    # Images preloaded by RSSFeed.get_feed don't need a query
+    image = getattr(id, 'image', None)
+    if image is not None:
+        return image
     return Image.objects.get(pk=id)
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from lxml import etree as ET
+from . import signals
+from .extractors import FeedExtractor, get_extractor
+from .fetchers import FetchError, PooledFetcher, Urllib2Fetcher
+from .leader import LeaderElector
+from .metrics import RunMetrics
+from .models import IntervalSchedule, RSSSource, RSSImport
+from .retention import prune_source, purge_expired
+from .tasks import RssSourceProcessor
+import StringIO, threading
+
+ETAG = '"feed-v1"'
+
+FEED = '''<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Stub</title>
+<item><guid>1</guid><title>First</title></item>
+<item><guid>2</guid><title>Second</title></item>
+<item><guid>2</guid><title>Second again</title></item>
+<item><guid>3</guid><title>Third</title></item>
+</channel></rss>'''
+
+SETTINGS = {
+    'wrapper': './channel/item',
+    'unique': ['guid'],
+    'fields': [{'source': 'guid'}, {'source': 'title'}],
+}
+
+
+MEDIA_FEED = '''<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel><title>Stub</title>
+%s
+<related>%s</related>
+</channel></rss>'''
+
+MEDIA_ITEM = '''<item><guid>%(n)s</guid><pubDate>1%(n)s Jun 2003 04:00:00 GMT</pubDate>
+<media:content url="http://example.com/%(n)s.jpg" medium="image"/>
+<enclosure url="http://example.com/%(n)s.mp3" type="audio/mpeg"/>
+<thumbnail>http://example.com/t%(n)s.jpg</thumbnail></item>'''
+
+MEDIA_SETTINGS = {
+    'wrapper': './channel/item',
+    'unique': ['guid'],
+    'fields': [
+        {'source': 'guid'},
+        {'source': 'pubDate', 'target': 'date', 'type': 'date', 'save_format': '%Y-%m-%d'},
+        {'source': 'media:content', 'target': 'image', 'type': 'image', 'empty': True,
+            'attributes': [{'source': 'url'}, {'source': 'medium', 'target': 'kind'}], 'location': 'url'},
+        {'source': 'enclosure', 'empty': True, 'attributes': 'url'},
+        {'source': 'thumbnail', 'type': 'image'},
+    ],
+}
+
+def build_media_feed(items, related):
+    return MEDIA_FEED % (''.join(MEDIA_ITEM % {'n': n} for n in items), ''.join(MEDIA_ITEM % {'n': n} for n in related))
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Serves FEED at /feed.xml with an ETag, a redirect to it and 404 for the rest
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        if self.path == '/redirect':
+            self._send(302, '', Location='/feed.xml')
+        elif self.path != '/feed.xml':
+            self._send(404, '')
+        elif self.headers.get('If-None-Match') == ETAG:
+            self._send(304, '')
+        else:
+            self._send(200, FEED, ETag=ETAG)
+
+    def _send(self, status, body, **headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServerMixin(object):
+
+    @classmethod
+    def setUpClass(cls):
+        super(StubServerMixin, cls).setUpClass()
+        cls.server = StubServer(('127.0.0.1', 0), StubHandler)
+        cls.server.connections = set()
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.base_url = 'http://127.0.0.1:%s' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(StubServerMixin, cls).tearDownClass()
+
+    def setUp(self):
+        super(StubServerMixin, self).setUp()
+        self.server.connections.clear()
+
+
+class FetcherTests(StubServerMixin, SimpleTestCase):
+
+    def get_fetchers(self):
+        return [Urllib2Fetcher(5), PooledFetcher(5, 5, 2)]
+
+    def test_open(self):
+        for fetcher in self.get_fetchers():
+            response = fetcher.open(self.base_url + '/feed.xml')
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.getheader('ETag'), ETAG)
+            self.assertEqual(response.read(), FEED)
+            response.close()
+
+    def test_conditional_get(self):
+        for fetcher in self.get_fetchers():
+            response = fetcher.open(self.base_url + '/feed.xml', {'If-None-Match': ETAG})
+            self.assertEqual(response.status, 304)
+            response.close()
+
+    def test_pooled_redirect(self):
+        response = PooledFetcher(5, 5, 2).open(self.base_url + '/redirect')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), FEED)
+        response.close()
+
+    def test_pooled_reuses_connections(self):
+        fetcher = PooledFetcher(5, 5, 2)
+        for n in range(3):
+            response = fetcher.open(self.base_url + '/feed.xml')
+            response.read()
+            response.close()
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_pooled_error(self):
+        with self.assertRaises(FetchError):
+            PooledFetcher(5, 5, 2).open(self.base_url + '/missing.xml')
+
+
+class SourceTestMixin(StubServerMixin):
+
+    def create_source(self, **kwargs):
+        interval, created = IntervalSchedule.objects.get_or_create(frequency=1, period='hours')
+        return RSSSource.objects.create(name='Stub', url=self.base_url + '/feed.xml', settings=SETTINGS,
+            task='process_rss', interval=interval, enabled=False, **kwargs)
+
+    def parse(self, source):
+        extractor = get_extractor(source)
+        rss_file = RssSourceProcessor(source.pk)._fetch(source)[0]
+        parsed_items = []
+        for item in extractor.iter_items(rss_file):
+            item_to_save, image_fields = extractor.extract(item)
+            parsed_items.append((source.get_fingerprint(item_to_save), item_to_save, bool(image_fields), image_fields))
+        return parsed_items
+
+
+class ExtractorTests(SimpleTestCase):
+
+    def test_extract(self):
+        extractor = FeedExtractor(MEDIA_SETTINGS)
+        element = ET.fromstring(build_media_feed([1], [])).find('./channel/item')
+        item_to_save, image_fields = extractor.extract(element)
+        self.assertEqual(item_to_save, {
+            'guid': '1',
+            'date': '2003-06-11',
+            'image': {'url': 'http://example.com/1.jpg', 'kind': 'image'},
+            'enclosure': 'http://example.com/1.mp3',
+            'thumbnail': 'http://example.com/t1.jpg',
+        })
+        # Empty images are downloaded from their location attribute, the others from their text
+        self.assertEqual(image_fields, [
+            {'name': 'image', 'url': 'http://example.com/1.jpg'},
+            {'name': 'thumbnail', 'url': 'http://example.com/t1.jpg'},
+        ])
+
+    def test_stream_parity(self):
+        feed = build_media_feed([1, 2, 3], [4])
+        for wrapper, guids in (('./channel/item', ['1', '2', '3']), ('.//item', ['1', '2', '3', '4'])):
+            extractor = FeedExtractor(dict(MEDIA_SETTINGS, wrapper=wrapper))
+            self.assertIsNotNone(extractor.wrapper_steps)
+            parsed = [extractor.extract(item) for item in extractor.iter_items(StringIO.StringIO(feed))]
+            streamed = [extractor.extract(item) for item in extractor.iter_items(StringIO.StringIO(feed), stream=True)]
+            self.assertEqual([item_to_save['guid'] for item_to_save, image_fields in parsed], guids)
+            self.assertEqual(streamed, parsed)
+
+
+class FetchTests(SourceTestMixin, TestCase):
+
+    def test_fetch(self):
+        source = self.create_source()
+        rss_file, validators = RssSourceProcessor(source.pk)._fetch(source)
+        self.assertEqual(rss_file.read(), FEED)
+        self.assertEqual(validators['etag'], ETAG)
+        self.assertEqual(len(validators['content_digest']), 40)
+
+    def test_not_modified(self):
+        source = self.create_source()
+        RSSSource.objects.filter(pk=source.pk).update(etag=ETAG)
+        source.refresh_from_db()
+        self.assertIsNone(RssSourceProcessor(source.pk)._fetch(source))
+
+    def test_same_content(self):
+        source = self.create_source()
+        rss_file, validators = RssSourceProcessor(source.pk)._fetch(source)
+        RSSSource.objects.filter(pk=source.pk).update(content_digest=validators['content_digest'])
+        source.refresh_from_db()
+        self.assertIsNone(RssSourceProcessor(source.pk)._fetch(source))
+        source.refresh_from_db()
+        self.assertEqual(source.etag, ETAG)
+
+    @override_settings(RSS_IMPORT_FETCH_MAX_BYTES=64)
+    def test_size_cap(self):
+        source = self.create_source()
+        with self.assertRaises(FetchError):
+            RssSourceProcessor(source.pk)._fetch(source)
+
+
+class IngestTests(SourceTestMixin, TestCase):
+
+    def test_dedup(self):
+        source = self.create_source()
+        parsed_items = self.parse(source)
+
+        metrics = RunMetrics(source.pk)
+        processed, imported = RssSourceProcessor(source.pk)._ingest(source, parsed_items, metrics)
+        self.assertEqual((processed, imported), (3, 3))
+        self.assertEqual(metrics.counters['new'], 3)
+        self.assertEqual(metrics.counters['duplicated'], 1)
+        source.refresh_from_db()
+        self.assertEqual((source.total_items, source.complete_items, source.scheduled_items), (3, 3, 0))
+        # The first occurrence of a repeated item is kept
+        self.assertEqual(RSSImport.objects.get(source=source, fingerprint=parsed_items[1][0]).content['title'], 'Second')
+
+        metrics = RunMetrics(source.pk)
+        processed, imported = RssSourceProcessor(source.pk)._ingest(source, parsed_items, metrics)
+        self.assertEqual(imported, 0)
+        self.assertEqual(metrics.counters['new'], 0)
+        self.assertEqual(metrics.counters['duplicated'], 4)
+        self.assertEqual(RSSImport.objects.filter(source=source, status='complete', enabled=True).count(), 3)
+
+
+def build_feed(guids):
+    items = ''.join('<item><guid>%s</guid><title>Item %s</title></item>' % (guid, guid) for guid in guids)
+    return StringIO.StringIO('<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>%s</channel></rss>' % items)
+
+
+class WatermarkTests(SimpleTestCase):
+
+    def parse(self, guids, full_scan=False, watermark='', reverse=False, **process_settings):
+        source = RSSSource(settings=dict(SETTINGS, **process_settings), watermark=watermark, reverse=reverse)
+        metrics = RunMetrics(None)
+        parsed_items, watermark = RssSourceProcessor(None)._parse(source, build_feed(guids), full_scan, metrics)
+        return [content['guid'] for fingerprint, content, image_process, image_fields in parsed_items], watermark, metrics
+
+    def fingerprint(self, guid):
+        return RSSSource(settings=SETTINGS).get_fingerprint({'guid': guid, 'title': 'Item %s' % guid})
+
+    def test_newest_first(self):
+        guids, watermark, metrics = self.parse(['5', '4', '3', '2', '1'], full_scan=True, order='newest_first')
+        self.assertEqual((guids, watermark), (['5', '4', '3', '2', '1'], self.fingerprint('5')))
+
+        guids, watermark, metrics = self.parse(['5', '4', '3', '2', '1'], watermark=self.fingerprint('3'), order='newest_first')
+        self.assertEqual((guids, watermark), (['5', '4'], self.fingerprint('5')))
+        self.assertEqual(metrics.counters['seen'], 3)
+
+        guids, watermark, metrics = self.parse(['5', '4', '3', '2', '1'], watermark=self.fingerprint('3'), reverse=True, order='newest_first')
+        self.assertEqual((guids, watermark), (['4', '5'], self.fingerprint('5')))
+
+        guids, watermark, metrics = self.parse(['5', '4', '3', '2', '1'], full_scan=True, order='newest_first', max_items=2)
+        self.assertEqual(guids, ['5', '4'])
+
+    def test_oldest_first(self):
+        guids, watermark, metrics = self.parse(['1', '2', '3', '4', '5'], full_scan=True, order='oldest_first')
+        self.assertEqual((guids, watermark), (['1', '2', '3', '4', '5'], self.fingerprint('5')))
+
+        guids, watermark, metrics = self.parse(['1', '2', '3', '4', '5'], watermark=self.fingerprint('3'), order='oldest_first')
+        self.assertEqual((guids, watermark), (['4', '5'], self.fingerprint('5')))
+        self.assertEqual(metrics.counters['duplicated'], 3)
+
+        guids, watermark, metrics = self.parse(['1', '2', '3', '4', '5'], full_scan=True, order='oldest_first', max_items=2)
+        self.assertEqual(guids, ['4', '5'])
+
+    def test_without_order(self):
+        # Without an order the watermark is neither used nor stored, new items are never dropped
+        guids, watermark, metrics = self.parse(['6', '5', '4', '3'], watermark=self.fingerprint('4'))
+        self.assertEqual((guids, watermark), (['6', '5', '4', '3'], ''))
+
+        guids, watermark, metrics = self.parse(['6', '5', '4', '3'], full_scan=True, max_items=2)
+        self.assertEqual(guids, ['6', '5'])
+
+
+class DeleteTests(SourceTestMixin, TransactionTestCase):
+
+    def test_bulk_delete(self):
+        source = self.create_source()
+        RssSourceProcessor(source.pk)._ingest(source, self.parse(source), RunMetrics(source.pk))
+
+        refreshes = []
+        refresh_item_counters = signals.refresh_item_counters
+        signals.refresh_item_counters = lambda source_id: refreshes.append(source_id) or refresh_item_counters(source_id)
+        try:
+            RSSImport.objects.filter(source=source).delete()
+        finally:
+            signals.refresh_item_counters = refresh_item_counters
+
+        # Refreshed once for the three imports deleted
+        self.assertEqual(refreshes, [source.pk])
+        source.refresh_from_db()
+        self.assertEqual(source.total_items, 0)
+
+
+class LeaderTests(TestCase):
+
+    def test_single_leader(self):
+        first = LeaderElector(None)
+        second = LeaderElector(None)
+        self.assertTrue(first._renew())
+        self.assertTrue(first._renew())
+        self.assertFalse(second._renew())
+
+        first.is_leader = True
+        first.stop()
+        self.assertTrue(second._renew())
+        self.assertFalse(first._renew())
+
+
+class RetentionTests(SourceTestMixin, TestCase):
+
+    def test_keep_items(self):
+        source = self.create_source(keep_items=2)
+        parsed_items = self.parse(source)
+        RssSourceProcessor(source.pk)._ingest(source, parsed_items, RunMetrics(source.pk))
+
+        self.assertEqual(prune_source(source, dry_run=True), (1, 0))
+        self.assertFalse(RSSImport.objects.filter(source=source, status='expired').exists())
+        self.assertEqual(prune_source(source), (1, 0))
+        expired = RSSImport.objects.get(source=source, status='expired')
+        self.assertEqual((expired.content, expired.enabled), ({}, False))
+        source.refresh_from_db()
+        self.assertEqual(source.total_items, 2)
+        self.assertEqual(prune_source(source), (0, 0))
+
+        # Items still in the feed aren't imported again once expired
+        processed, imported = RssSourceProcessor(source.pk)._ingest(source, parsed_items, RunMetrics(source.pk))
+        self.assertEqual(imported, 0)
+        self.assertEqual(RSSImport.objects.filter(source=source).count(), 3)
+
+    def test_purge_expired(self):
+        source = self.create_source(keep_items=2)
+        parsed_items = self.parse(source)
+        RssSourceProcessor(source.pk)._ingest(source, parsed_items, RunMetrics(source.pk))
+        prune_source(source)
+        self.assertEqual(purge_expired(source), 0)
+
+        # A full scan listing the expired item keeps it
+        RSSSource.objects.filter(pk=source.pk).update(full_scan_date=timezone.now())
+        RssSourceProcessor(source.pk)._ingest(source, parsed_items, RunMetrics(source.pk))
+        source.refresh_from_db()
+        self.assertEqual(purge_expired(source), 0)
+
+        # A full scan without it deletes it
+        RSSSource.objects.filter(pk=source.pk).update(full_scan_date=timezone.now())
+        source.refresh_from_db()
+        self.assertEqual(purge_expired(source, dry_run=True), 1)
+        self.assertEqual(purge_expired(source), 1)
+        self.assertFalse(RSSImport.objects.filter(source=source, status='expired').exists())
+        self.assertEqual(RSSImport.objects.filter(source=source).count(), 2)
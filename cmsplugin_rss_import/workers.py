@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from Queue import Queue, Full
+import threading, time, warnings
+
+class WorkerPool(object):
+
+    """
+    Bounded pool of daemon threads fed by a queue. Every task is submitted with
+    a key and a task is refused while another one with the same key is queued
+    or running, so a slow run is never overlapped by the next one.
+    """
+
+    def __init__(self, name, max_workers, queue_size=0):
+        self.name = name
+        self.max_workers = max_workers
+        self._queue = Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._active = 0
+        self._workers = []
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def active_workers(self):
+        return self._active
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'active_workers': self.active_workers,
+            'max_workers': self.max_workers,
+            'pending': len(self._pending),
+        }
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    def submit(self, key, function, *args, **kwargs):
+        """
+        Queues a task, returning False if it was refused
+        """
+        with self._lock:
+            if key in self._pending:
+                warnings.warn('%s: a task for %s is already queued or running' % (self.name, key))
+                return False
+
+            try:
+                self._queue.put_nowait((key, function, args, kwargs))
+            except Full:
+                warnings.warn('%s: the queue is full, dropping the task for %s' % (self.name, key))
+                return False
+
+            self._pending.add(key)
+            self._start_workers()
+        return True
+
+    def join(self):
+        """
+        Blocks until every queued task is done
+        """
+        self._queue.join()
+
+    def wait(self, timeout):
+        """
+        Waits up to timeout seconds for the queued and running tasks, returning whether they finished
+        """
+        deadline = time.time() + timeout
+        while self._pending and time.time() < deadline:
+            time.sleep(0.5)
+        return not self._pending
+
+    def _start_workers(self):
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_workers and len(self._workers) < self._queue.qsize() + self._active:
+            worker = threading.Thread(target=self._work, name='%s-%s' % (self.name, len(self._workers)))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            key, function, args, kwargs = self._queue.get()
+            with self._lock:
+                self._active += 1
+            try:
+                function(*args, **kwargs)
+            except Exception as e:
+                warnings.warn('%s: error running the task for %s: %s' % (self.name, key, str(e)))
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._pending.discard(key)
+                self._queue.task_done()